@@ -39,6 +39,10 @@ if __name__ == '__main__':  # Entry point when running this script
     # from_date = dt.datetime.utcnow() - dt.timedelta(hours=24*7)  # we take data for the last week from the current time
     # data = store.getdata(timeframe=bt.TimeFrame.Minutes, compression=60, dataname=symbol, start_date=from_date, LiveBars=False)
 
+    # # 4. Historical 1-minute bars for the last hour + the live bar updated while it forms, at most every 2 seconds / timeframe M1
+    # from_date = dt.datetime.utcnow() - dt.timedelta(minutes=60)  # we take data for the last 1 hour
+    # data = store.getdata(timeframe=bt.TimeFrame.Minutes, compression=1, dataname=symbol, start_date=from_date, LiveBars=True, partial=True, partial_throttle=2)
+
     cerebro.adddata(data)  # Adding data
     cerebro.addstrategy(StrategyJustPrintsOHLCVAndState, coin_target=coin_target)  # Adding a trading system
 
@@ -0,0 +1,52 @@
+import backtrader as bt
+import sys,os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backtrader_binance import BinanceStore
+from ConfigBinance.Config import Config  # Configuration file
+
+
+class StrategyPrintsTicks(bt.Strategy):
+    """Displays the 1-second bars of the trades and the best bid/ask of the ticker"""
+
+    def next(self):
+        trades, book = self.datas
+        print('{} / {} - Open: {}, High: {}, Low: {}, Close: {}, Volume: {} - Bid: {} ({}), Ask: {} ({})'.format(
+            bt.num2date(trades.datetime[0]),
+            trades._name,
+            trades.open[0],
+            trades.high[0],
+            trades.low[0],
+            trades.close[0],
+            trades.volume[0],
+            book.bid[0],
+            book.bidsize[0],
+            book.ask[0],
+            book.asksize[0],
+        ))
+
+
+# Live trades and best bid/ask of ticker
+if __name__ == '__main__':  # Entry point when running this script
+    cerebro = bt.Cerebro(quicknotify=True)
+
+    coin_target = 'USDT'  # the base ticker in which calculations will be performed
+    symbol = 'BTC' + coin_target  # the ticker by which we will receive data in the format <CodeTickerBaseTicker>
+
+    store = BinanceStore(
+        api_key=Config.BINANCE_API_KEY,
+        api_secret=Config.BINANCE_API_SECRET,
+        coin_target=coin_target,
+        testnet=False)  # Binance Storage
+
+    # Aggregated trades built into 1-second bars, bar_seconds=0 delivers every trade
+    trades = store.gettrades(dataname=symbol, bar_seconds=1)
+    # Best bid/ask, the lines are the quotes at the end of each 1-second bar
+    book = store.getbookticker(dataname=symbol, bar_seconds=1)
+
+    cerebro.adddata(trades)  # Adding data
+    cerebro.adddata(book)
+    cerebro.addstrategy(StrategyPrintsTicks)  # Adding a trading system
+
+    cerebro.run()  # Launching a trading system
@@ -31,6 +31,10 @@ if __name__ == '__main__':  # Точка входа при запуске это
     # from_date = dt.datetime.utcnow() - dt.timedelta(hours=24*7)  # берем данные за последнюю неделю от текущего времени
     # data = store.getdata(timeframe=bt.TimeFrame.Minutes, compression=60, dataname=symbol, start_date=from_date, LiveBars=False)
 
+    # # 4. Исторические 1-минутные бары за прошлый час + live бар, обновляемый по мере формирования, не чаще раза в 2 секунды / таймфрейм M1
+    # from_date = dt.datetime.utcnow() - dt.timedelta(minutes=60)  # берем данные за последний час
+    # data = store.getdata(timeframe=bt.TimeFrame.Minutes, compression=1, dataname=symbol, start_date=from_date, LiveBars=True, partial=True, partial_throttle=2)
+
     cerebro.adddata(data)  # Добавляем данные
     cerebro.addstrategy(StrategyJustPrintsOHLCVAndState, coin_target=coin_target)  # Добавляем торговую систему
 
@@ -0,0 +1,52 @@
+import backtrader as bt
+import sys,os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backtrader_binance import BinanceStore
+from ConfigBinance.Config import Config  # Файл конфигурации
+
+
+class StrategyPrintsTicks(bt.Strategy):
+    """Выводит 1-секундные бары сделок и лучшие цены спроса/предложения тикера"""
+
+    def next(self):
+        trades, book = self.datas
+        print('{} / {} - Open: {}, High: {}, Low: {}, Close: {}, Volume: {} - Bid: {} ({}), Ask: {} ({})'.format(
+            bt.num2date(trades.datetime[0]),
+            trades._name,
+            trades.open[0],
+            trades.high[0],
+            trades.low[0],
+            trades.close[0],
+            trades.volume[0],
+            book.bid[0],
+            book.bidsize[0],
+            book.ask[0],
+            book.asksize[0],
+        ))
+
+
+# Live сделки и лучшие цены спроса/предложения тикера
+if __name__ == '__main__':  # Точка входа при запуске этого скрипта
+    cerebro = bt.Cerebro(quicknotify=True)
+
+    coin_target = 'USDT'  # базовый тикер, в котором будут осуществляться расчеты
+    symbol = 'BTC' + coin_target  # тикер, по которому будем получать данные в формате <КодТикераБазовыйТикер>
+
+    store = BinanceStore(
+        api_key=Config.BINANCE_API_KEY,
+        api_secret=Config.BINANCE_API_SECRET,
+        coin_target=coin_target,
+        testnet=False)  # Хранилище Binance
+
+    # Агрегированные сделки, собранные в 1-секундные бары, bar_seconds=0 выдает каждую сделку
+    trades = store.gettrades(dataname=symbol, bar_seconds=1)
+    # Лучшие цены спроса/предложения, линии содержат котировки на конец каждого 1-секундного бара
+    book = store.getbookticker(dataname=symbol, bar_seconds=1)
+
+    cerebro.adddata(trades)  # Добавляем данные
+    cerebro.adddata(book)
+    cerebro.addstrategy(StrategyPrintsTicks)  # Добавляем торговую систему
+
+    cerebro.run()  # Запуск торговой системы
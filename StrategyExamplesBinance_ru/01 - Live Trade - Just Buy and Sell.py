@@ -45,7 +45,6 @@ class JustBuySellStrategy(bt.Strategy):
                 if status == 0:  # Live trade
                     coin_target = self.p.coin_target
                     print(f"\t - Free balance: {self.broker.getcash()} {coin_target}")
-                    # Very slow function! Because we are going through API to get those values...
                     symbol_balance, short_symbol_name = self.broker._store.get_symbol_balance(ticker)
                     print(f"\t - {ticker} current balance = {symbol_balance} {short_symbol_name}")
 
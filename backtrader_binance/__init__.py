@@ -1 +1,2 @@
 from .binance_store import BinanceStore
+from .binance_async_store import BinanceAsyncStore
@@ -0,0 +1,24 @@
+import asyncio
+
+from .binance_broker import BinanceBroker
+
+
+class BinanceAsyncBroker(BinanceBroker):
+    """BinanceBroker of a BinanceAsyncStore, async orders are sent by the event loop instead of a worker pool"""
+    params = (
+        ('async_orders', True),
+    )
+
+    def _dispatch_order(self, *args):
+        self._store.aclient  # Connects before handing over to the loop, which can't block on it
+        asyncio.run_coroutine_threadsafe(self._send_order_async(*args), self._store.loop)
+
+    async def _send_order_async(self, order, symbol, side, exectype, size, price, params):
+        """Event loop side of async_orders, acceptance and fills arrive from the user data stream"""
+        try:
+            binance_order = await self._store.create_order_async(symbol, side, exectype, size, price, **params)
+        except Exception as e:
+            self._order_failed(order, e)
+            return
+
+        order.info['binance_id'] = binance_order['orderId']
@@ -0,0 +1,32 @@
+import asyncio
+
+from .binance_feed import BinanceData
+from .binance_queue import BinanceQueue
+
+
+class BinanceAsyncData(BinanceData):
+    """BinanceData of a BinanceAsyncStore, with the block policy a full queue holds its socket back until Cerebro catches up.
+    It is awaited on the event loop, the other sockets keep being read"""
+
+    def __init__(self, store, **kwargs):
+        BinanceData.__init__(self, store, **kwargs)
+        self._room = asyncio.Event()  # set by Cerebro when it takes a kline from a full queue
+        self._paused = False
+
+    async def _handle_kline_socket_message(self, msg):
+        BinanceData._handle_kline_socket_message(self, msg)  # A backfill runs on its own thread
+
+        if self._data.policy == BinanceQueue.BLOCK and self._data.full():
+            self._paused = True
+            while self._data.full():
+                self._room.clear()
+                if not self._data.full():  # Taken before the clear
+                    break
+                await self._room.wait()
+            self._paused = False
+
+    def _load_kline(self):
+        ret = BinanceData._load_kline(self)
+        if self._paused:
+            self._store.loop.call_soon_threadsafe(self._room.set)
+        return ret
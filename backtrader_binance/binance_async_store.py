@@ -0,0 +1,208 @@
+import asyncio
+import inspect
+import threading
+import time
+
+import aiohttp
+
+from binance import AsyncClient, BinanceSocketManager
+from binance.exceptions import BinanceAPIException, ReadLoopClosed
+
+from .binance_async_broker import BinanceAsyncBroker
+from .binance_async_feed import BinanceAsyncData
+from .binance_store import BinanceStore
+
+
+class BinanceSyncClient(object):
+    """Blocking Client interface of the store's AsyncClient for the BinanceStore methods,
+    the requests run on the event loop and the calling thread waits for them"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._store.aclient, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        return lambda *args, **kwargs: self._store.run(attr(*args, **kwargs))
+
+
+class BinanceAsyncSocketManager(object):
+    """ThreadedWebsocketManager calls of the store and broker, served by BinanceSocketManager sockets read on the event loop"""
+    # python-binance stops reading the socket after these, it is opened again
+    _FATAL_ERRORS = ('BinanceWebsocketQueueOverflow', 'BinanceWebsocketUnableToConnect')
+
+    def __init__(self, store, manager):
+        self._store = store
+        self._manager = manager
+        self._tasks = []
+
+    def start_multiplex_socket(self, callback, streams):
+        self._start(lambda: self._manager.multiplex_socket(streams), callback)
+
+    def start_user_socket(self, callback):
+        self._start(self._manager.user_socket, callback)
+
+    def _start(self, open_socket, callback):
+        self._tasks.append(asyncio.run_coroutine_threadsafe(self._read(open_socket, callback), self._store.loop))
+
+    async def _read(self, open_socket, callback):
+        """Hands the socket messages to callback, awaiting it when it holds the socket back"""
+        while True:
+            try:
+                async with open_socket() as socket:
+                    while True:
+                        msg = await socket.recv()
+                        if msg.get('e') == 'error' and msg.get('type') in self._FATAL_ERRORS:
+                            print("Socket reopened:", msg['m'])
+                            break
+                        result = callback(msg)
+                        if inspect.isawaitable(result):
+                            await result
+            except ReadLoopClosed:
+                pass
+            except Exception as e:
+                if self._store._stopped.is_set():  # Closed by stop_socket
+                    return
+                print("Exception (socket):", e)
+
+            # Messages were lost, the feeds backfill their klines as after any reconnect
+            try:
+                result = callback({'e': 'error', 'type': 'BinanceWebsocketClosed', 'm': 'Socket reopened'})
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:  # The socket is reopened whatever the callback does with it
+                print("Exception (socket reopened):", e)
+            await asyncio.sleep(1)
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def join(self, timeout=None):
+        pass
+
+
+class BinanceAsyncStore(BinanceStore):
+    """BinanceStore running every stream and REST request on one asyncio event loop thread
+    https://python-binance.readthedocs.io/en/latest/overview.html#async-api-calls"""
+    BrokerCls = BinanceAsyncBroker
+    DataCls = BinanceAsyncData
+
+    def __init__(self, *args, queue_size=1000, **kwargs):
+        self.queue_size = queue_size  # messages python-binance buffers per socket
+        self._loop = None
+        self._loop_thread = None
+        self._aclient = None
+        self._sync_client = BinanceSyncClient(self)
+        BinanceStore.__init__(self, *args, **kwargs)
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            with self._connect_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._loop_thread = threading.Thread(target=loop.run_forever, name='binance_loop', daemon=True)
+                    self._loop_thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def run(self, coro):
+        """Runs coro on the event loop and waits for its result"""
+        if threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError("Blocking BinanceAsyncStore call from its event loop")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            if self.offline:
+                raise RuntimeError("BinanceStore is offline")
+            aclient = self.run(self._create_aclient())
+            with self._connect_lock:
+                if self._aclient is None:
+                    self._timestamp_offset = aclient.timestamp_offset
+                    self._aclient = aclient
+                else:
+                    self.run(aclient.close_connection())
+        return self._aclient
+
+    async def _create_aclient(self):
+        if self.base_url is None:
+            return await AsyncClient.create(self._api_key, self._api_secret, testnet=self.testnet, tld=self.tld)
+
+        # AsyncClient.create would ping Binance before the urls can be changed
+        aclient = self._redirect(AsyncClient(self._api_key, self._api_secret, testnet=self.testnet, tld=self.tld))
+        res = await aclient.get_server_time()
+        aclient.timestamp_offset = res['serverTime'] - int(time.time() * 1000)
+        return aclient
+
+    @property
+    def binance(self):
+        self.aclient.timestamp_offset = self._timestamp_offset
+        return self._sync_client
+
+    @property
+    def binance_socket(self):
+        if self.replay is not None:
+            return BinanceStore.binance_socket.fget(self)
+        if self._binance_socket is None:
+            aclient = self.aclient
+
+            async def create_manager():  # Bound to the running loop
+                manager = BinanceSocketManager(aclient, max_queue_size=self.queue_size)
+                if self.base_url is not None:
+                    manager.STREAM_URL = f"{self._ws_url}/"
+                return manager
+
+            manager = self.run(create_manager())
+            with self._connect_lock:
+                if self._binance_socket is None:
+                    self._binance_socket = BinanceAsyncSocketManager(self, manager)
+        return self._binance_socket
+
+    async def request(self, name, *args, **kwargs):
+        """Awaitable retry of the AsyncClient method name, for code running on the event loop"""
+        for attempt in range(1, self.retries + 1):
+            await self._limiter.acquire_async(self._WEIGHTS.get(name, 1))
+            self._rest_requests.inc(name)
+            try:
+                self.aclient.timestamp_offset = self._timestamp_offset
+                result = await getattr(self.aclient, name)(*args, **kwargs)
+            except (BinanceAPIException, aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if isinstance(err, BinanceAPIException):
+                    self._update_used_weight(err.response)
+                delay = self._request_failed(name, err, attempt)
+                if delay is None:
+                    self._resync_timestamp(await self.aclient.get_server_time())
+                if attempt == self.retries:
+                    raise
+                self._rest_retries.inc(name)
+                if delay:
+                    await asyncio.sleep(delay)
+            else:
+                self._update_used_weight(self.aclient.response)
+                return result
+
+    async def create_order_async(self, symbol, side, type, size, price, **params):
+        return await self.request('create_order', **self._order_params(symbol, side, type, size, price, **params))
+
+    async def _handle_multiplex_socket_message(self, msg, streams):
+        """Awaits the callbacks holding the socket back, e.g. BinanceAsyncData with a full queue"""
+        for callback, payload in self._stream_calls(msg, streams):
+            result = callback(payload)
+            if inspect.isawaitable(result):
+                await result
+
+    def stop_socket(self):
+        BinanceStore.stop_socket(self)
+        if self._aclient is not None:
+            self.run(self._aclient.close_connection())
+            self._aclient = None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(5)
+            self._loop = self._loop_thread = None
@@ -1,13 +1,27 @@
 import datetime as dt
+import time
+import uuid
 import binance.enums as be
 
-from collections import defaultdict, deque
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from backtrader.broker import BrokerBase
 from backtrader.order import *
 from backtrader.position import Position
 
+from .binance_journal import RECONNECT_ERRORS
+from .binance_queue import BinanceQueue
+
 class BinanceBroker(BrokerBase):
+    params = (
+        ('async_orders', False),  # buy/sell return Submitted orders, a worker pool sends them
+        ('order_workers', 4),
+        # order notifications waiting for Cerebro, 0 is unbounded. Order states can't be dropped, a full queue blocks
+        # the thread notifying: the socket thread with every stream of the store, or the event loop of BinanceAsyncStore
+        ('notifs_size', 0),
+    )
+
     _ORDER_TYPES = {
         Order.Limit: be.ORDER_TYPE_LIMIT,
         Order.Market: be.ORDER_TYPE_MARKET,
@@ -18,19 +32,35 @@ class BinanceBroker(BrokerBase):
     def __init__(self, store):
         super(BinanceBroker, self).__init__()
 
-        self.notifs = deque()
+        self.notifs = BinanceQueue(self.p.notifs_size)  # never drops, order states can't be skipped
         self.positions = defaultdict(Position)
 
         self.startingcash = self.cash = 0
         self.startingvalue = self.value = self.cash
 
-        self.open_orders = dict()
+        self.open_orders = dict()  # binance_id: order
+        self._client_orders = dict()  # clientOrderId: order
+        self._order_pool = None
     
         self._store = store
-        self._store.binance_socket.start_user_socket(self._handle_user_socket_message)
+
+        metrics = store.metrics
+        metrics.gauge('binance_open_orders', "Orders open on Binance", ('symbol',)).track(self._count_open_orders)
+        metrics.gauge('binance_notifications_depth', "Order notifications waiting for Cerebro").track(lambda: {(): len(self.notifs)})
+        self._orders_submitted = metrics.counter('binance_orders_submitted_total', "Orders submitted", ('symbol',))
+        self._order_round_trip = metrics.summary('binance_order_round_trip_seconds', "Submit to final order status", ('status',))
 
     def start(self):
-        pass
+        self.notifs.maxsize = self.p.notifs_size  # store.getbroker sets the params after __init__
+        if self._store.streaming:
+            self._store.start_user_socket(self._handle_user_socket_message)
+        if not self._store.offline:
+            self._store.start_balance_reconcile()
+
+    def stop(self):
+        if self._order_pool is not None:
+            self._order_pool.shutdown(wait=True)
+            self._order_pool = None
 
     def _handle_user_socket_message(self, msg):
         """https://binance-docs.github.io/apidocs/spot/en/#payload-order-update"""
@@ -42,22 +72,50 @@ class BinanceBroker(BrokerBase):
         # 'm': False, 'M': True, 'O': 1707120960761, 'Z': '5.10296600', 'Y': '5.10296600', 'Q': '0.00000000', 'W': 1707120960761, 'V': 'EXPIRE_MAKER'}
         if msg['e'] == 'executionReport':
             if msg['s'] in self._store.symbols:
-                for binance_id, order in self.open_orders.items():
-                    if binance_id == msg['i']:
-                        trade = {'qty': msg['l'], 'price': msg['L'], 'commission': msg['n']}
-                        self._process_trading_message(order, msg['X'], msg['T'], [trade])
-                        break
+                order = self.open_orders.get(msg['i']) or self._client_orders.get(msg['c'])
+                if order is not None:
+                    order.info['binance_id'] = msg['i']  # Async orders may report before their REST response
+                    trade = {'qty': msg['l'], 'price': msg['L'], 'commission': msg['n']}
+                    self._process_trading_message(order, msg['X'], msg['T'], [trade])
+        elif msg['e'] in ('outboundAccountPosition', 'balanceUpdate'):
+            self._store.update_balances(msg)
         elif msg['e'] == 'error':
-            raise msg
+            if msg.get('type') not in RECONNECT_ERRORS:
+                raise RuntimeError(f"User data stream error: {msg}")
+            # Reports are not resent, orders changed meanwhile keep their last state until their next report
+            print("Socket reconnecting for user data:", msg['m'])
     
     def _submit(self, order):
         exectype = self._ORDER_TYPES.get(order.exectype, be.ORDER_TYPE_MARKET)
         symbol = order.data.symbol
         side = be.SIDE_BUY if order.ordtype == Order.Buy else be.SIDE_SELL
         size = abs(order.size) if order.size else None
-        binance_order = self._store.create_order(symbol, side, exectype, size, order.price, **order.info)
+        params = dict(order.info)
+        order.info['submit_time'] = time.monotonic()  # round trip start, after params so it is not sent
+        self._orders_submitted.inc(symbol)
+        if self._store.tracer is not None:
+            self._store.tracer.submitted(order)
+
+        if self._store.offline:  # A replayed journal has no exchange to send the order to, e.g. BackBroker simulates fills
+            print(f"Exception (order rejected): BinanceStore is offline, the {symbol} order is not sent")
+            order.submit()
+            self._order_done(order, be.ORDER_STATUS_REJECTED)
+            order.reject()
+            self.notify(order)
+            return order
+
+        if self.p.async_orders:
+            params['newClientOrderId'] = order.info['client_order_id'] = uuid.uuid4().hex
+            self._client_orders[order.info['client_order_id']] = order
+            order.submit()
+            self.notify(order)
+            self._dispatch_order(order, symbol, side, exectype, size, order.price, params)
+            return order
+
+        binance_order = self._store.create_order(symbol, side, exectype, size, order.price, **params)
         
         order.info['binance_id'] = binance_order['orderId']
+        order.info['client_order_id'] = binance_order['clientOrderId']
         order.executed.remsize = float(binance_order['executedQty'])
         order.submit()
         # print(1111, binance_order)
@@ -71,23 +129,80 @@ class BinanceBroker(BrokerBase):
         
         return order
     
+    def _dispatch_order(self, *args):
+        if self._order_pool is None:
+            self._order_pool = ThreadPoolExecutor(max_workers=self.p.order_workers, thread_name_prefix='binance_orders')
+        self._order_pool.submit(self._send_order, *args)
+
+    def _send_order(self, order, symbol, side, exectype, size, price, params):
+        """Worker side of async_orders, acceptance and fills arrive from the user data stream"""
+        try:
+            binance_order = self._store.create_order(symbol, side, exectype, size, price, **params)
+        except Exception as e:
+            self._order_failed(order, e)
+            return
+
+        order.info['binance_id'] = binance_order['orderId']
+        if self._store.tracer is not None:
+            self._store.tracer.acked(order)
+
+    def _order_failed(self, order, e):
+        print("Exception (order rejected):", e)
+        self._client_orders.pop(order.info['client_order_id'], None)
+        self._order_done(order, be.ORDER_STATUS_REJECTED)
+        order.reject()
+        self.notify(order)
+
     def _process_trading_message(self, order, status, transact_time, trades):
+        if self._store.tracer is not None:
+            if status == be.ORDER_STATUS_NEW:
+                self._store.tracer.acked(order)
+            elif status in (be.ORDER_STATUS_PARTIALLY_FILLED, be.ORDER_STATUS_FILLED):
+                self._store.tracer.filled(order)
         match status:
             case be.ORDER_STATUS_NEW:
-                self.open_orders.update({order.info['binance_id']: order})
+                self._add_open_order(order)
                 order.accept()
             case be.ORDER_STATUS_PARTIALLY_FILLED:
-                self.open_orders.update({order.info['binance_id']: order})
+                self._add_open_order(order)
                 self._process_order_trades(order, transact_time, trades)
                 order.partial()
             case be.ORDER_STATUS_FILLED:
-                self.open_orders.pop(order.info['binance_id'], None)
+                self._remove_open_order(order)
                 self._process_order_trades(order, transact_time, trades)                
                 order.completed()    
+            case be.ORDER_STATUS_CANCELED:
+                self._remove_open_order(order)
+                order.cancel()
+            case be.ORDER_STATUS_EXPIRED:
+                self._remove_open_order(order)
+                order.expire()
             case be.ORDER_STATUS_REJECTED:
+                self._remove_open_order(order)
                 order.reject()
         
+        if status in (be.ORDER_STATUS_FILLED, be.ORDER_STATUS_CANCELED, be.ORDER_STATUS_EXPIRED, be.ORDER_STATUS_REJECTED):
+            self._order_done(order, status)
         self.notify(order)
+
+    def _order_done(self, order, status):
+        submit_time = order.info.pop('submit_time', None)  # Once per order, a final status may be reported twice
+        if submit_time is not None:
+            self._order_round_trip.observe(time.monotonic() - submit_time, status)
+
+    def _count_open_orders(self):
+        counts = defaultdict(int)
+        for order in list(self.open_orders.values()):
+            counts[(order.data.symbol,)] += 1
+        return counts
+
+    def _add_open_order(self, order):
+        self.open_orders[order.info['binance_id']] = order
+        self._client_orders[order.info['client_order_id']] = order
+
+    def _remove_open_order(self, order):
+        self.open_orders.pop(order.info.get('binance_id'), None)
+        self._client_orders.pop(order.info.get('client_order_id'), None)
     
     def _process_order_trades(self, order, transact_time, trades):
         comminfo = self.getcommissioninfo(order.data)
@@ -129,9 +244,14 @@ class BinanceBroker(BrokerBase):
         return self._submit(order)
 
     def cancel(self, order):
-        order_id = order.info['binance_id']
+        if self._store.offline:  # Offline orders are rejected, none is open
+            return
+        order_id = order.info.get('binance_id')
         symbol = order.data.symbol
-        self._store.cancel_order(symbol=symbol, order_id=order_id)
+        if order_id is None:  # Async order still waiting for its REST response
+            self._store.cancel_order(symbol=symbol, client_order_id=order.info['client_order_id'])
+        else:
+            self._store.cancel_order(symbol=symbol, order_id=order_id)
         
     def format_price(self, value):
         return self._store.format_price(value)
@@ -143,10 +263,7 @@ class BinanceBroker(BrokerBase):
         return self.cash
 
     def get_notification(self):
-        if not self.notifs:
-            return None
-
-        return self.notifs.popleft()
+        return self.notifs.get()
 
     def getposition(self, data, clone=True):
         pos = self.positions[data]
@@ -164,7 +281,10 @@ class BinanceBroker(BrokerBase):
         return self.value
 
     def notify(self, order):
-        self.notifs.append(order)
+        self.notifs.put(order.clone())  # Snapshot, async orders keep changing in other threads
+        with self._store.new_kline:  # Wakes the feeds waiting for klines, Cerebro delivers the notification at once
+            self._store.new_kline_time = time.monotonic()
+            self._store.new_kline.notify_all()
 
     def sell(self, owner, data, size, price=None, plimit=None,
              exectype=None, valid=None, tradeid=0, oco=None,
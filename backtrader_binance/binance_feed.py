@@ -1,21 +1,37 @@
-from collections import deque
-
-import pandas as pd
+import datetime as dt
+import threading
+import time
 
 from backtrader.feed import DataBase
+from binance.helpers import interval_to_milliseconds
 from backtrader.utils import date2num
 
 from backtrader import TimeFrame as tf
 
+from .binance_journal import RECONNECT_ERRORS
+from .binance_queue import BinanceQueue
+
 
 class BinanceData(DataBase):
     params = (
         ('drop_newest', True),
+        ('mmap', False),  # read history straight from the store's memory-mapped cache (needs cache_dir)
+        ('qcheck', 0.5),  # max seconds a live feed sleeps waiting for klines, any new kline wakes it up
+        ('partial', False),  # deliver the updates of the forming kline, replayed on the current bar until it closes
+        ('partial_throttle', 0.0),  # min seconds between the forming kline updates delivered, 0 delivers all of them
+        ('queue_size', 10000),  # live klines waiting for Cerebro, 0 is unbounded
+        # when the queue is full: block, drop_oldest or coalesce, dropped klines are counted in queue_stats.
+        # None blocks when replaying a journal and drops the oldest kline live: a blocked put stalls the socket thread,
+        # so every subscription of the store and its user data stream, until Cerebro takes a kline
+        ('queue_policy', None),
+        ('queue_timeout', None),  # max seconds a blocked put waits before dropping the oldest kline
     )
     
     # States for the Finite State Machine in _load
     _ST_LIVE, _ST_HISTORBACK, _ST_OVER = range(3)
 
+    _EPOCH = dt.datetime(1970, 1, 1)
+
     def __init__(self, store, **kwargs):  # def __init__(self, store, timeframe, compression, start_date, LiveBars):
         # default values
         self.timeframe = tf.Minutes
@@ -31,24 +47,117 @@ class BinanceData(DataBase):
         if 'LiveBars' in kwargs: self.LiveBars = kwargs['LiveBars']
 
         self._store = store
-        self._data = deque()
+        policy = self.p.queue_policy or (BinanceQueue.BLOCK if store.replay is not None else BinanceQueue.DROP_OLDEST)
+        self._data = BinanceQueue(self.p.queue_size, policy, self.p.queue_timeout)  # live klines
+        self._history = ()  # klines loaded by start, delivered before _data
+        self._history_idx = 0
+        self._last_time = None  # open time (ms) of the last kline queued
+        self._qstart = 0.0  # monotonic start of the current Cerebro loop
+        self._reconnected = False
+        self._backfilling = False  # a worker is downloading the klines missed, socket klines wait in _held behind them
+        self._held = []  # (kline, closed) received while backfilling
+        self._backfill_lock = threading.Lock()
+        self._partial_time = 0.0  # monotonic time of the last forming kline update queued
+        self._delivered_time = None  # open time (ms) of the bar on the lines
+        # the current bar is updated in place, as done by the Replayer filter, also the kline still open at the end of the history
+        self.replaying = self.p.partial or not self.p.drop_newest
+        self._trace_bar = None  # open time, received and loaded monotonic times of the live bar on the lines, if tracing
 
         # print("Ok", self.timeframe, self.compression, self.start_date, self._store, self.LiveBars, self.symbol)
 
     def _handle_kline_socket_message(self, msg):
         """https://binance-docs.github.io/apidocs/spot/en/#kline-candlestick-streams"""
         if msg['e'] == 'kline':
+            if msg['k']['x'] or self._reconnected:
+                self._backfill(msg['k']['t'])
+                self._reconnected = False
             if msg['k']['x']:  # Is closed
-                kline = self._parser_to_kline(msg['k']['t'], msg['k'])
-                self._data.extend(kline.values.tolist())
+                if self._store.tracer is not None and 'E' in msg:  # Event time on Binance's clock
+                    self._store.tracer.record('exchange', (self._store.time_ms() + self._store._timestamp_offset - msg['E']) / 1000)
+                self._queue_socket_kline(self._parser_to_kline(msg['k']))
+            elif self.p.partial:
+                now = time.monotonic()
+                if now - self._partial_time >= self.p.partial_throttle:
+                    self._partial_time = now
+                    self._queue_socket_kline(self._parser_to_kline(msg['k']), closed=False)
         elif msg['e'] == 'error':
-            raise msg
+            if msg.get('type') not in RECONNECT_ERRORS:  # klines may be missed, they are backfilled
+                raise RuntimeError(f"Socket error for ticker {self.symbol}: {msg}")
+            print(f"Socket reconnecting for ticker: {self.symbol}", msg['m'])
+            self._reconnected = True
+
+    def _needs_backfill(self, open_time):
+        if self._last_time is None or self._store.offline:  # Replayed sessions have no REST to fill gaps from
+            return False
+        return not self._interval_ms or open_time - self._last_time > self._interval_ms  # Gap
+
+    def _queue_socket_kline(self, kline, closed=True):
+        """Queues a kline of the socket if newer than the last one queued, behind the backfill if one is running"""
+        with self._backfill_lock:
+            if self._backfilling:
+                self._held.append((kline, closed))
+                return
+        if self._last_time is None or kline[0] > self._last_time:  # Not queued yet
+            self._put_kline(kline, closed)
+
+    def _backfill(self, open_time):
+        """Queues the klines opened after the last queued one and before open_time, missed by the socket.
+        They are downloaded by a worker thread, the socket thread serves every stream and the user data stream"""
+        with self._backfill_lock:
+            if self._backfilling or not self._needs_backfill(open_time):
+                return
+            self._backfilling = True
+        threading.Thread(target=self._run_backfill, args=(self._last_time, open_time), daemon=True).start()
+
+    def _run_backfill(self, last_time, open_time):
+        try:
+            klines = self._store.get_historical_klines(self.symbol_info['symbol'], self.interval, last_time + 1, open_time - 1)
+            now = int(dt.datetime.now(dt.timezone.utc).timestamp() * 1000)
+            klines = self._store._klines_to_array([kline for kline in klines if kline[6] < now]).tolist()
+        except Exception as e:
+            print(f"Exception (klines not backfilled for {self.symbol}):", e)
+            klines = []
+
+        with self._backfill_lock:  # The socket holds its klines back until they are queued in order
+            for kline in klines:
+                if kline[0] > self._last_time:
+                    self._put_kline(kline)
+            for kline, closed in self._held:
+                if self._last_time is None or kline[0] > self._last_time:
+                    self._put_kline(kline, closed)
+            self._held = []
+            self._backfilling = False
+
+    def _put_kline(self, kline, closed=True):
+        # Partial updates of a kline still queued are replaced by the newer one
+        self._data.put(kline, key=kline[0] if self.p.partial else None)
+        if closed:
+            self._last_time = kline[0]
+        with self._store.new_kline:
+            self._store.new_kline_time = time.monotonic()
+            self._store.new_kline.notify_all()
+
+    def _wait_kline(self):
+        """Sleeps up to qcheck seconds, until any feed of the store queues a kline"""
+        with self._store.new_kline:
+            # A kline queued since the loop started is delivered by another feed, don't hold it back
+            if not self._data and self._store.new_kline_time < self._qstart:
+                self._store.new_kline.wait(self._qcheck)
+
+    def do_qcheck(self, onoff, qlapse):
+        DataBase.do_qcheck(self, onoff, qlapse)
+        self._qstart = time.monotonic() - qlapse
 
     def _load(self):
         if self._state == self._ST_OVER:
             return False
         elif self._state == self._ST_LIVE:
-            return self._load_kline()
+            replay_done = self._store.replay_done.is_set()  # Before the get, so the last klines replayed are taken
+            loaded = self._load_kline()
+            if loaded is None and replay_done:
+                self._state = self._ST_OVER
+                return False
+            return loaded
         elif self._state == self._ST_HISTORBACK:
             if self._load_kline():
                 return True
@@ -56,53 +165,79 @@ class BinanceData(DataBase):
                 self._start_live()
 
     def _load_kline(self):
-        try:
-            kline = self._data.popleft()
-        except IndexError:
-            return None
+        if self._history_idx < len(self._history):
+            kline = self._history[self._history_idx].tolist()
+            self._history_idx += 1
+        else:
+            if not self._data and self._state == self._ST_LIVE:
+                self._wait_kline()
+            kline = self._data.get()
+            if kline is None:
+                return None
+            if self._store.tracer is not None:
+                now = time.monotonic()
+                self._store.tracer.record('queue', self._data.lag)
+                self._trace_bar = (kline[0], now - self._data.lag, now)  # open time, received, loaded
+
+        if self.replaying and kline[0] == self._delivered_time:  # Same bar, undo the forward of load and update it in place
+            self.backwards(force=True)
+        self._delivered_time = kline[0]
+        self._fill_lines(kline)
+        return True
 
+    def _fill_lines(self, kline):
         timestamp, open_, high, low, close, volume = kline
 
-        self.lines.datetime[0] = date2num(timestamp)
+        self.lines.datetime[0] = date2num(self._EPOCH + dt.timedelta(milliseconds=timestamp))
         self.lines.open[0] = open_
         self.lines.high[0] = high
         self.lines.low[0] = low
         self.lines.close[0] = close
         self.lines.volume[0] = volume
-        return True
-    
-    def _parser_dataframe(self, data):
-        df = data.copy()
-        df.columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
-        df['timestamp'] = df['timestamp'].values.astype(dtype='datetime64[ms]')
-        df['open'] = df['open'].values.astype(float)
-        df['high'] = df['high'].values.astype(float)
-        df['low'] = df['low'].values.astype(float)
-        df['close'] = df['close'].values.astype(float)
-        df['volume'] = df['volume'].values.astype(float)
-        # df.set_index('timestamp', inplace=True)
-        return df
     
-    def _parser_to_kline(self, timestamp, kline):
-        df = pd.DataFrame([[timestamp, kline['o'], kline['h'],
-                            kline['l'], kline['c'], kline['v']]])
-        return self._parser_dataframe(df)
+    def _last_closed_time(self, arrays):
+        """Open time (ms) of the newest closed kline of the history arrays, the socket queues the klines after it.
+        A kline still open is kept by drop_newest=False, its closed version replaces it on the lines"""
+        now = int(time.time() * 1000)
+        for klines in reversed(arrays):  # Memory-mapped history is followed by the klines still open
+            times = klines['timestamp']
+            if self._interval_ms:
+                times = times[times + self._interval_ms <= now]
+            elif len(times) and self._is_open(int(times[-1])):
+                times = times[:-1]
+            if len(times):
+                return int(times[-1])
+        return None
+
+    def _is_open(self, open_time):
+        """Whether the kline opened at open_time (ms) is still forming"""
+        if self._interval_ms:
+            return open_time + self._interval_ms > int(time.time() * 1000)
+        opened = dt.datetime.fromtimestamp(open_time / 1000, dt.timezone.utc)  # Months have no fixed length
+        now = dt.datetime.now(dt.timezone.utc)
+        return (opened.year, opened.month) == (now.year, now.month)
+
+    def _parser_to_kline(self, kline):
+        """Kline stream payload to the (timestamp, open, high, low, close, volume) record of BinanceStore._KLINE_DTYPE"""
+        return (kline['t'], float(kline['o']), float(kline['h']),
+                float(kline['l']), float(kline['c']), float(kline['v']))
     
     def _start_live(self):
         # if live mode
-        if self.LiveBars:
+        if self.LiveBars and self._store.streaming:
             self._state = self._ST_LIVE
             self.put_notification(self.LIVE)
 
             print(f"Live started for ticker: {self.symbol}")
 
-            self._store.binance_socket.start_kline_socket(
-                self._handle_kline_socket_message,
-                self.symbol_info['symbol'],
-                self.interval)
+            self._store.start_streams()
         else:
             self._state = self._ST_OVER
         
+    def queue_stats(self):
+        """Depth, lag and drop counters of the live klines queue"""
+        return self._data.stats()
+
     def haslivedata(self):
         return self._state == self._ST_LIVE and self._data
 
@@ -113,6 +248,7 @@ class BinanceData(DataBase):
         DataBase.start(self)
 
         self.interval = self._store.get_interval(self.timeframe, self.compression)
+        self._interval_ms = self.interval and interval_to_milliseconds(self.interval)  # None for months
         if self.interval is None:
             self._state = self._ST_OVER
             self.put_notification(self.NOTSUPPORTED_TF)
@@ -124,25 +260,32 @@ class BinanceData(DataBase):
             self.put_notification(self.NOTSUBSCRIBED)
             return
 
+        if self.LiveBars and self._store.streaming:  # Klines received before the history is delivered wait in _data
+            self._store.subscribe(f"{self.symbol_info['symbol'].lower()}@kline_{self.interval}",
+                                  self._handle_kline_socket_message)
+
+        self._state = self._ST_HISTORBACK  # _load starts live once the history is delivered
         if self.start_date:
-            self._state = self._ST_HISTORBACK
             self.put_notification(self.DELAYED)
 
-            klines = self._store.binance.get_historical_klines(
-                self.symbol_info['symbol'],
-                self.interval,
-                self.start_date.strftime('%d %b %Y %H:%M:%S'))
+            start_date = self.start_date
+            if start_date.tzinfo is None:  # naive start_date is in UTC
+                start_date = start_date.replace(tzinfo=dt.timezone.utc)
+            start_time = int(start_date.timestamp() * 1000)
+            if self.p.mmap and self._store.cache_dir:  # Only the klines still open are loaded to memory
+                self._history, klines = self._store.map_klines(self.symbol_info['symbol'], self.interval, start_time)
+            else:
+                klines = self._store.load_klines(self.symbol_info['symbol'], self.interval, start_time)
 
             try:
-                if self.p.drop_newest:
-                    klines.pop()
+                if self.p.drop_newest and len(klines) and self._is_open(int(klines['timestamp'][-1])):
+                    klines = klines[:-1]  # Cached or offline klines may all be closed already
 
-                df = pd.DataFrame(klines)
-                df.drop(df.columns[[6, 7, 8, 9, 10, 11]], axis=1, inplace=True)  # Remove unnecessary columns
-                df = self._parser_dataframe(df)
-                self._data.extend(df.values.tolist())
+                if len(self._history):  # Memory-mapped, followed by the klines still open
+                    for kline in klines.tolist():
+                        self._data.put(kline)
+                else:
+                    self._history = klines
+                self._last_time = self._last_closed_time([a for a in (self._history, klines) if len(a)])
             except Exception as e:
                 print("Exception (try set start_date in utc format):", e)
-
-        else:
-            self._start_live()
@@ -0,0 +1,181 @@
+import gzip
+import inspect
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+# Socket errors after which python-binance reconnects, messages may be missed meanwhile
+RECONNECT_ERRORS = ('IncompleteReadError', 'gaierror', 'ConnectionClosedError', 'ConnectionClosedOK', 'BinanceWebsocketClosed')
+
+
+class BinanceJournal(object):
+    """Gzip journal of the raw socket messages of live sessions, each with its receive time.
+    Every session writes its own file, path then path.1, path.2, ..., so a session cut by a crash
+    is never followed by another one in the same gzip stream"""
+    MARKET, USER = 0, 1  # channels: combined market streams, user data stream
+
+    _RECORD = struct.Struct('<qBI')  # receive time (ns since the epoch), channel, JSON payload length
+    _CHUNK = 1 << 16  # compressed bytes read at a time
+
+    def __init__(self, path, flush_interval=1.0):
+        sessions = self.sessions(path)
+        self.path = f"{path}.{len(sessions)}" if sessions else path  # file of this session
+        self.flush_interval = flush_interval  # max seconds a record waits before it can be read back, even if the process dies
+        self.records = 0
+        self._file = gzip.open(self.path, 'xb')
+        self._lock = threading.Lock()  # market and user sockets may write from different threads
+        self._flush_time = time.monotonic()
+
+    def write(self, channel, msg):
+        payload = json.dumps(msg, separators=(',', ':')).encode()
+        record = self._RECORD.pack(time.time_ns(), channel, len(payload)) + payload
+        with self._lock:
+            if self._file is None:  # Closed
+                return
+            self._file.write(record)
+            self.records += 1
+            now = time.monotonic()
+            if now - self._flush_time >= self.flush_interval:
+                self._file.flush(zlib.Z_SYNC_FLUSH)
+                self._flush_time = now
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def sessions(path):
+        """Session files of the journal at path, oldest first"""
+        sessions = []
+        while os.path.exists(session := f"{path}.{len(sessions)}" if sessions else path):
+            sessions.append(session)
+        return sessions
+
+    @classmethod
+    def read(cls, path):
+        """Yields (receive time in ns, channel, message) of every record of every session,
+        up to the last one flushed of a session that was cut"""
+        for session in cls.sessions(path):
+            yield from cls._read_session(session)
+
+    @classmethod
+    def _read_session(cls, path):
+        """Records of a session file. Decompressed by hand, GzipFile drops what it decoded before a cut
+        and can't go on with the next gzip member"""
+        decompressor = zlib.decompressobj(wbits=31)  # gzip member
+        buffer = b''
+        with open(path, 'rb') as f:
+            while chunk := f.read(cls._CHUNK):
+                while chunk:
+                    saved = decompressor.copy()
+                    try:
+                        buffer += decompressor.decompress(chunk)
+                    except zlib.error:  # Cut member, the bytes after it belong to no record
+                        buffer += cls._salvage(saved, chunk)
+                        yield from cls._records(buffer)
+                        return
+                    offset = yield from cls._records(buffer)
+                    buffer = buffer[offset:]
+                    if not decompressor.eof:
+                        break
+                    chunk = decompressor.unused_data  # Next member, a record cut at the end of the last one is lost
+                    decompressor = zlib.decompressobj(wbits=31)
+                    buffer = b''
+
+    @staticmethod
+    def _salvage(decompressor, chunk):
+        """Output of decompressor up to the first bad byte of chunk"""
+        out = b''
+        for i in range(len(chunk)):
+            try:
+                out += decompressor.decompress(chunk[i:i + 1])
+            except zlib.error:
+                break
+        return out
+
+    @classmethod
+    def _records(cls, buffer):
+        """Yields the complete records of buffer, returns the offset of the first incomplete one"""
+        offset = 0
+        while len(buffer) - offset >= cls._RECORD.size:
+            receive_time, channel, size = cls._RECORD.unpack_from(buffer, offset)
+            end = offset + cls._RECORD.size + size
+            if end > len(buffer):
+                break
+            yield receive_time, channel, json.loads(buffer[offset + cls._RECORD.size:end])
+            offset = end
+        return offset
+
+
+class BinanceReplaySocketManager(object):
+    """ThreadedWebsocketManager calls of the store and broker, served from a BinanceJournal
+    as fast as the feeds take the messages (speed 0) or at speed times their original pacing"""
+
+    def __init__(self, store, path, speed=0.0):
+        self._store = store
+        self.path = path
+        self.speed = speed
+        self._streams = {}  # stream: callback of its connection
+        self._user_callback = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start_multiplex_socket(self, callback, streams):
+        for stream in streams:
+            self._streams[stream] = callback
+        if self._thread is None:  # The feeds went live, every stream was subscribed
+            self._thread = threading.Thread(target=self._replay, name='binance_replay', daemon=True)
+            self._thread.start()
+
+    def start_user_socket(self, callback):
+        self._user_callback = callback
+
+    def _replay(self):
+        try:
+            self._replay_messages()
+        except Exception as e:
+            print("Exception (replay stopped):", e)
+        finally:  # The feeds end with the journal, however it ends
+            self._store.replay_done.set()
+            with self._store.new_kline:  # Wakes the feeds waiting for klines, they are over
+                self._store.new_kline.notify_all()
+
+    def _replay_messages(self):
+        first_time = None
+        start = time.monotonic()
+        for receive_time, channel, msg in BinanceJournal.read(self.path):
+            if self._stopped.is_set():
+                return
+            if self.speed:
+                if first_time is None:
+                    first_time = receive_time
+                delay = (receive_time - first_time) / 1e9 / self.speed - (time.monotonic() - start)
+                if delay > 0 and self._stopped.wait(delay):
+                    return
+            self._store.replay_time = receive_time // 1000000
+
+            if channel == BinanceJournal.USER:
+                callbacks = [self._user_callback]
+            elif 'stream' in msg:
+                callbacks = [self._streams.get(msg['stream'])]
+            else:  # Errors of a connection, it is not recorded which one
+                callbacks = set(self._streams.values())
+            for callback in callbacks:
+                if callback is None:  # Stream not subscribed in this session
+                    continue
+                result = callback(msg)
+                if inspect.isawaitable(result):  # BinanceAsyncStore
+                    self._store.run(result)
+
+    def stop(self):
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
@@ -0,0 +1,172 @@
+import json
+import math
+import threading
+import time
+
+from collections import OrderedDict
+
+import backtrader as bt
+
+
+class BinanceLatencyHistogram(object):
+    """Log-bucketed latencies, 4 buckets per doubling from 1 µs, so any percentile is within 19%"""
+    _BUCKETS_PER_OCTAVE = 4
+
+    def __init__(self):
+        self.counts = {}  # bucket: latencies recorded
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        bucket = int(math.log2(us) * self._BUCKETS_PER_OCTAVE) + 1 if us >= 1 else 0
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def _upper(self, bucket):
+        """Upper bound (seconds) of bucket"""
+        return 2 ** (bucket / self._BUCKETS_PER_OCTAVE) / 1e6
+
+    def percentile(self, q):
+        """q-th percentile (0..100) in seconds, the upper bound of its bucket capped to the max"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._upper(bucket), self.max)
+        return self.max
+
+    def stats(self):
+        ms = lambda seconds: round(seconds * 1000, 4) if seconds is not None else None
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.total / self.count if self.count else None),
+            'min_ms': ms(self.min),
+            'p50_ms': ms(self.percentile(50)),
+            'p90_ms': ms(self.percentile(90)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max),
+        }
+
+
+class BinanceLatencyTracer(object):
+    """Monotonic timestamps of every hop from kline close to fill report, tied to the bars and orders,
+    aggregated into a histogram per stage"""
+    STAGES = (
+        'exchange',  # kline close event at Binance to its message received, on Binance's clock
+        'queue',  # message received to the bar loaded on the feed lines
+        'next',  # bar loaded to the strategy's next() returned
+        'decision',  # bar loaded to the order submitted
+        'ack',  # order submitted to accepted by Binance, REST response or execution report
+        'fill',  # order accepted to its first fill report
+        'tick_to_trade',  # message received to the first fill report of the order it triggered
+    )
+
+    def __init__(self, orders_kept=1000):
+        self.histograms = {stage: BinanceLatencyHistogram() for stage in self.STAGES}
+        self.orders_kept = orders_kept
+        self._orders = OrderedDict()  # order ref: hops of the most recent orders
+        self._lock = threading.Lock()  # hops are recorded by the socket, Cerebro and order threads
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].record(seconds)
+
+    def bar(self, data):
+        """(open time, received, loaded) of the live bar on the lines of data, None if it came from history"""
+        return getattr(data, '_trace_bar', None)
+
+    def submitted(self, order):
+        now = time.monotonic()
+        trace = {'symbol': order.data.symbol, 'bar': None, 'received': None, 'loaded': None,
+                 'submitted': now, 'acked': None, 'filled': None, 'binance_id': None}
+        bar = self.bar(order.data)
+        if bar is not None:
+            trace['bar'], trace['received'], trace['loaded'] = bar
+        with self._lock:
+            if bar is not None:
+                self.histograms['decision'].record(now - trace['loaded'])
+            self._orders[order.ref] = trace
+            while len(self._orders) > self.orders_kept:
+                self._orders.popitem(last=False)
+
+    def acked(self, order):
+        now = time.monotonic()
+        with self._lock:
+            trace = self._orders.get(order.ref)
+            if trace is None or trace['acked'] is not None:
+                return
+            trace['acked'] = now
+            trace['binance_id'] = order.info.get('binance_id')
+            self.histograms['ack'].record(now - trace['submitted'])
+
+    def filled(self, order):
+        self.acked(order)  # A market order may be filled in its REST response
+        now = time.monotonic()
+        with self._lock:
+            trace = self._orders.get(order.ref)
+            if trace is None or trace['filled'] is not None:
+                return
+            trace['filled'] = now
+            self.histograms['fill'].record(now - trace['acked'])
+            if trace['received'] is not None:
+                self.histograms['tick_to_trade'].record(now - trace['received'])
+
+    def order(self, order):
+        """Hops of order (monotonic seconds), None once it is older than the orders_kept last ones"""
+        with self._lock:
+            trace = self._orders.get(order.ref)
+            return dict(trace) if trace is not None else None
+
+    def stats(self):
+        """{stage: {count, mean_ms, min_ms, p50_ms, p90_ms, p99_ms, max_ms}}"""
+        with self._lock:
+            return {stage: histogram.stats() for stage, histogram in self.histograms.items()}
+
+    def export(self, path):
+        """Writes the stats and the raw histogram buckets as JSON"""
+        with self._lock:
+            doc = {stage: dict(histogram.stats(), buckets={str(b): c for b, c in sorted(histogram.counts.items())})
+                   for stage, histogram in self.histograms.items()}
+        with open(path, 'w') as f:
+            json.dump(doc, f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {stage: BinanceLatencyHistogram() for stage in self.STAGES}
+            self._orders.clear()
+
+
+class BinanceLatencyAnalyzer(bt.Analyzer):
+    """Times the strategy's next() from the live bars it got, cerebro.addanalyzer(BinanceLatencyAnalyzer)
+    with a BinanceStore(trace_latency=True); the analysis is the tracer stats"""
+
+    def start(self):
+        self._tracer = self.datas[0]._store.tracer if self.datas else None
+        self._timed = [None] * len(self.datas)  # loaded time of the last bar timed, by data
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        if self._tracer is None:
+            return
+        now = time.monotonic()
+        for i, data in enumerate(self.datas):
+            bar = self._tracer.bar(data)
+            if bar is not None and self._timed[i] != bar[2]:
+                self._timed[i] = bar[2]
+                self._tracer.record('next', now - bar[2])
+
+    def get_analysis(self):
+        return self._tracer.stats() if self._tracer is not None else {}
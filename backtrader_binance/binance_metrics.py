@@ -0,0 +1,241 @@
+import copy
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .binance_latency import BinanceLatencyHistogram
+
+
+class BinanceMetric(object):
+    """Values of a metric by label values, set by the code it measures or read from it by track on every collect"""
+    TYPE = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)  # label names
+        self._values = {}  # label values: value
+        self._functions = []
+        self._lock = threading.Lock()
+
+    def track(self, func):
+        """func() returns {label values: value}, it is called on every collect instead of the hot path updating it"""
+        self._functions.append(func)
+
+    def samples(self):
+        """{label values: value}"""
+        with self._lock:
+            values = dict(self._values)
+        for func in self._functions:
+            values.update(func())
+        return values
+
+
+class BinanceCounter(BinanceMetric):
+    TYPE = 'counter'
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+
+class BinanceGauge(BinanceMetric):
+    TYPE = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class BinanceSummary(BinanceMetric):
+    """Durations in seconds, a BinanceLatencyHistogram by label values"""
+    TYPE = 'summary'
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            histogram = self._values.get(labels)
+            if histogram is None:
+                histogram = self._values[labels] = BinanceLatencyHistogram()
+            histogram.record(seconds)
+
+    def samples(self):
+        """{label values: histogram}, copies as they stand, observe keeps updating the histograms"""
+        samples = {}
+        with self._lock:
+            for labels, histogram in self._values.items():
+                samples[labels] = copy.copy(histogram)
+                samples[labels].counts = dict(histogram.counts)
+        return samples
+
+
+class BinanceMetrics(object):
+    """Registry of the store, feed and broker metrics, read by the exporters when they collect"""
+
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})  # constant labels of every sample, e.g. {'bot': 'grid1'} to tell processes apart
+        self.exporters = []
+        self._metrics = OrderedDict()  # name: BinanceMetric
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        """Counter name, created on first use and shared by every caller after it"""
+        return self._get(BinanceCounter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(BinanceGauge, name, help, labels)
+
+    def summary(self, name, help, labels=()):
+        return self._get(BinanceSummary, name, help, labels)
+
+    def collect(self):
+        """[(metric, {label values: value})] of every metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [(metric, metric.samples()) for metric in metrics]
+
+    def snapshot(self):
+        """Every sample as a JSON-able dict, summaries as their histogram stats"""
+        metrics = {}
+        for metric, samples in self.collect():
+            metrics[metric.name] = {
+                'type': metric.TYPE,
+                'samples': [{'labels': dict(zip(metric.labels, values)),
+                             'value': value.stats() if metric.TYPE == 'summary' else value}
+                            for values, value in samples.items()],
+            }
+        return {'time': time.time(), 'pid': os.getpid(), 'labels': self.labels, 'metrics': metrics}
+
+    def prometheus(self):
+        """Every sample in the Prometheus text exposition format
+        https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format"""
+        lines = []
+        for metric, samples in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for values, value in samples.items():
+                labels = {**self.labels, **dict(zip(metric.labels, values))}
+                if metric.TYPE != 'summary':
+                    lines.append(f"{metric.name}{self._format_labels(labels)} {value!r}")
+                    continue
+                for q in metric.QUANTILES:
+                    quantile = value.percentile(q * 100)
+                    if quantile is not None:
+                        lines.append(f"{metric.name}{self._format_labels({**labels, 'quantile': str(q)})} {quantile!r}")
+                lines.append(f"{metric.name}_sum{self._format_labels(labels)} {value.total!r}")
+                lines.append(f"{metric.name}_count{self._format_labels(labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+    def export(self, exporter):
+        """Starts exporter on this registry, it is stopped with the store's sockets"""
+        exporter.start(self)
+        self.exporters.append(exporter)
+        return exporter
+
+    def stop(self):
+        for exporter in self.exporters:
+            exporter.stop()
+        self.exporters = []
+
+
+class BinanceMetricsExporter(object):
+    """Base of the exporters, BinanceMetrics.export starts them and BinanceMetrics.stop stops them"""
+
+    def start(self, metrics):
+        self.metrics = metrics
+
+    def stop(self):
+        pass
+
+
+class BinancePrometheusExporter(BinanceMetricsExporter):
+    """Serves the metrics at http://host:port/metrics for Prometheus to scrape, port 0 picks a free one"""
+
+    def __init__(self, host='127.0.0.1', port=9108):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self, metrics):
+        BinanceMetricsExporter.start(self, metrics)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # No line per scrape
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='binance_metrics', daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class BinanceSnapshotExporter(BinanceMetricsExporter):
+    """Appends a BinanceMetrics.snapshot as a JSON line to path every interval seconds, and a last one on stop"""
+
+    def __init__(self, path, interval=60):
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, metrics):
+        BinanceMetricsExporter.start(self, metrics)
+        self._thread = threading.Thread(target=self._run, name='binance_snapshots', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.metrics.snapshot(), separators=(',', ':')) + '\n')
+        except OSError as e:
+            print("Exception (metrics snapshot):", e)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self.dump()
@@ -0,0 +1,441 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+from aiohttp import WSMsgType, web
+
+from binance.helpers import interval_to_milliseconds
+
+
+class BinanceMockExchange(object):
+    """Local stand-in of the Binance spot endpoints the store uses, for tests and benchmarks:
+    REST klines, exchangeInfo, account, order and openOrders, kline streams and the user data stream.
+    BinanceStore(..., base_url=exchange.url) sends every request and socket to it"""
+
+    def __init__(self, host='127.0.0.1', port=0, symbols=None, balances=None, latency=0.0,
+                 stream_rate=1.0, fills=None, seed=0):
+        self.host = host
+        self.port = port  # 0 picks a free port, see url once started
+        self.symbols = symbols or {  # symbol: (base asset, quote asset, price)
+            'BTCUSDT': ('BTC', 'USDT', 60000.0),
+            'ETHUSDT': ('ETH', 'USDT', 3000.0),
+        }
+        self.balances = dict(balances or {'USDT': 10000.0})  # asset: free
+        self.latency = latency  # seconds added to every response and message, or (min, max) seconds
+        self.stream_rate = stream_rate  # kline messages per second and stream
+        self.fills = fills or self.market_fills  # fills(order) -> [(price, quantity), ...] when the order is placed
+        self.seed = seed
+        self.listed = {}  # symbol: listing time (ms), it has no kline opened before
+
+        self.orders = {}  # orderId: order as returned by GET order
+        self.requests = 0  # REST requests served
+        self.messages = 0  # socket messages sent
+        self._order_id = 0
+        self._trade_id = 0
+        self._user_sockets = {}  # subscriptionId: user data stream WebSocket API connection
+        self._subscription_ids = itertools.count()
+        self._sockets = set()
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Serves from a background thread, returns the base url"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='binance_mock', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self.url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _start(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes([
+            web.get('/api/v3/ping', self._ping),
+            web.get('/api/v3/time', self._time),
+            web.get('/api/v3/exchangeInfo', self._exchange_info),
+            web.get('/api/v3/klines', self._klines),
+            web.get('/api/v3/account', self._account),
+            web.get('/api/v3/order', self._get_order),
+            web.post('/api/v3/order', self._new_order),
+            web.delete('/api/v3/order', self._cancel_order),
+            web.get('/api/v3/openOrders', self._open_orders),
+            web.delete('/api/v3/openOrders', self._cancel_open_orders),
+            web.get('/stream', self._stream),
+            web.get('/ws-api/v3', self._ws_api),
+        ])
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def _stop(self):
+        for ws in list(self._sockets):
+            await ws.close()
+        await self._runner.cleanup()
+
+    # Scripting, from any thread
+
+    def fill(self, order_id, quantity=None, price=None):
+        """Fills quantity (the rest of the order by default) of an open order at price (the market price by default)"""
+        asyncio.run_coroutine_threadsafe(self._fill(self.orders[order_id], quantity, price), self._loop).result()
+
+    def set_price(self, symbol, price):
+        """Moves the market of symbol to price from now on"""
+        base, quote, _ = self.symbols[symbol]
+        self.symbols[symbol] = (base, quote, price / self._wave(symbol, self._now()))
+
+    def market_fills(self, order):
+        """Default fills: market orders fill at once at the market price, the rest wait for fill()"""
+        if order['type'] == 'MARKET':
+            return [(self.price(order['symbol'], self._now()), float(order['origQty']))]
+        return []
+
+    # Prices, a deterministic function of time so klines agree between REST and streams
+
+    def _wave(self, symbol, t):
+        noise = random.Random(f"{self.seed}{symbol}{t // 1000}").uniform(-1, 1)
+        return 1 + 0.02 * math.sin(2 * math.pi * t / 86400000) + 0.005 * math.sin(2 * math.pi * t / 3600000) + 0.0005 * noise
+
+    def price(self, symbol, t):
+        """Market price of symbol at t (ms)"""
+        return self.symbols[symbol][2] * self._wave(symbol, t)
+
+    def kline(self, symbol, interval, open_time, now=None):
+        """[open time, open, high, low, close, volume, close time, ...] as GET klines, still open if now is before its close"""
+        interval_ms = interval_to_milliseconds(interval)
+        close_time = open_time + interval_ms - 1
+        end = close_time if now is None else min(now, close_time)
+        prices = [self.price(symbol, t) for t in range(open_time, end, max(1000, (end - open_time) // 8))]
+        prices.append(self.price(symbol, end))
+        volume = random.Random(f"{self.seed}{symbol}{interval}{open_time}").uniform(1, 100) * (end - open_time + 1) / interval_ms
+        return [open_time, f"{prices[0]:.8f}", f"{max(prices):.8f}", f"{min(prices):.8f}", f"{prices[-1]:.8f}",
+                f"{volume:.8f}", close_time, f"{volume * prices[-1]:.8f}", 0, '0', '0', '0']
+
+    @staticmethod
+    def _now():
+        return int(time.time() * 1000)
+
+    # REST
+
+    def _delay(self):
+        if isinstance(self.latency, (tuple, list)):
+            return random.uniform(*self.latency)
+        return self.latency
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            response = await handler(request)
+        except web.HTTPException:
+            raise
+        except MockError as e:
+            response = web.json_response({'code': e.code, 'msg': e.msg}, status=400)
+        if not isinstance(response, web.WebSocketResponse):  # Sent already
+            response.headers['x-mbx-used-weight-1m'] = '1'
+        return response
+
+    @staticmethod
+    async def _params(request):
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    async def _ping(self, request):
+        return web.json_response({})
+
+    async def _time(self, request):
+        return web.json_response({'serverTime': self._now()})
+
+    async def _exchange_info(self, request):
+        return web.json_response({
+            'timezone': 'UTC',
+            'serverTime': self._now(),
+            'rateLimits': [],
+            'symbols': [{
+                'symbol': symbol,
+                'status': 'TRADING',
+                'baseAsset': base,
+                'quoteAsset': quote,
+                'orderTypes': ['LIMIT', 'MARKET', 'STOP_LOSS', 'STOP_LOSS_LIMIT'],
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'minPrice': '0.01000000', 'maxPrice': '1000000.00000000', 'tickSize': '0.01000000'},
+                    {'filterType': 'LOT_SIZE', 'minQty': '0.00001000', 'maxQty': '9000.00000000', 'stepSize': '0.00001000'},
+                    {'filterType': 'NOTIONAL', 'minNotional': '5.00000000'},
+                ],
+            } for symbol, (base, quote, _) in self.symbols.items()],
+        })
+
+    async def _klines(self, request):
+        params = await self._params(request)
+        symbol, interval = params['symbol'], params['interval']
+        if symbol not in self.symbols:
+            raise MockError(-1121, 'Invalid symbol.')
+        interval_ms = interval_to_milliseconds(interval)
+        now = self._now()
+        limit = min(int(params.get('limit', 500)), 1000)
+        end_time = min(int(params.get('endTime', now)), now)
+        if 'startTime' in params:
+            start = -(-int(params['startTime']) // interval_ms) * interval_ms  # First kline opened at startTime or later
+        else:
+            start = end_time - end_time % interval_ms - (limit - 1) * interval_ms
+        if symbol in self.listed:
+            start = max(start, -(-self.listed[symbol] // interval_ms) * interval_ms)
+        times = range(start, end_time + 1, interval_ms)[:limit]
+        return web.json_response([self.kline(symbol, interval, t, now) for t in times])
+
+    async def _account(self, request):
+        return web.json_response({
+            'accountType': 'SPOT',
+            'canTrade': True,
+            'updateTime': self._now(),
+            'balances': [{'asset': asset, 'free': f"{free:.8f}", 'locked': '0.00000000'}
+                         for asset, free in self.balances.items()],
+        })
+
+    def _find_order(self, params):
+        if 'orderId' in params:
+            order = self.orders.get(int(params['orderId']))
+        else:
+            order = next((o for o in self.orders.values() if o['clientOrderId'] == params.get('origClientOrderId')), None)
+        if order is None:
+            raise MockError(-2013, 'Order does not exist.')
+        return order
+
+    async def _get_order(self, request):
+        return web.json_response(self._find_order(await self._params(request)))
+
+    async def _new_order(self, request):
+        params = await self._params(request)
+        if params['symbol'] not in self.symbols:
+            raise MockError(-1121, 'Invalid symbol.')
+        self._order_id += 1
+        now = self._now()
+        order = {
+            'symbol': params['symbol'],
+            'orderId': self._order_id,
+            'orderListId': -1,
+            'clientOrderId': params.get('newClientOrderId') or f"mock{self._order_id}",
+            'transactTime': now,
+            'price': params.get('price', '0.00000000'),
+            'origQty': params['quantity'],
+            'executedQty': '0.00000000',
+            'cummulativeQuoteQty': '0.00000000',
+            'status': 'NEW',
+            'timeInForce': params.get('timeInForce', 'GTC'),
+            'type': params['type'],
+            'side': params['side'],
+            'stopPrice': params.get('stopPrice', '0.00000000'),
+            'time': now,
+            'updateTime': now,
+            'workingTime': now,
+            'selfTradePreventionMode': 'EXPIRE_MAKER',
+        }
+        self.orders[order['orderId']] = order
+        await self._send_execution_report(order, 'NEW')
+
+        trades = []
+        for price, quantity in self.fills(dict(order)):
+            trades.append(await self._fill(order, quantity, price))
+        return web.json_response(dict(order, fills=trades))
+
+    async def _cancel_order(self, request):
+        order = self._find_order(await self._params(request))
+        if order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+            raise MockError(-2011, 'Unknown order sent.')
+        await self._cancel(order)
+        return web.json_response(order)
+
+    async def _open_orders(self, request):
+        symbol = (await self._params(request)).get('symbol')
+        return web.json_response([o for o in self.orders.values()
+                                  if o['status'] in ('NEW', 'PARTIALLY_FILLED') and symbol in (None, o['symbol'])])
+
+    async def _cancel_open_orders(self, request):
+        symbol = (await self._params(request))['symbol']
+        canceled = []
+        for order in list(self.orders.values()):
+            if order['symbol'] == symbol and order['status'] in ('NEW', 'PARTIALLY_FILLED'):
+                await self._cancel(order)
+                canceled.append(order)
+        return web.json_response(canceled)
+
+    # Order book keeping
+
+    async def _cancel(self, order):
+        order['status'] = 'CANCELED'
+        order['updateTime'] = self._now()
+        await self._send_execution_report(order, 'CANCELED')
+
+    async def _fill(self, order, quantity=None, price=None):
+        """Executes quantity of order at price, returns the trade as in the fills of a FULL order response"""
+        executed = float(order['executedQty'])
+        quantity = float(order['origQty']) - executed if quantity is None else quantity
+        price = self.price(order['symbol'], self._now()) if price is None else price
+        executed += quantity
+        order['executedQty'] = f"{executed:.8f}"
+        order['cummulativeQuoteQty'] = f"{float(order['cummulativeQuoteQty']) + quantity * price:.8f}"
+        order['status'] = 'FILLED' if executed >= float(order['origQty']) - 1e-12 else 'PARTIALLY_FILLED'
+        order['updateTime'] = self._now()
+        self._trade_id += 1
+
+        base, quote, _ = self.symbols[order['symbol']]
+        sign = 1 if order['side'] == 'BUY' else -1
+        self.balances[base] = self.balances.get(base, 0.0) + sign * quantity
+        self.balances[quote] = self.balances.get(quote, 0.0) - sign * quantity * price
+
+        trade = {'price': f"{price:.8f}", 'qty': f"{quantity:.8f}", 'commission': '0.00000000',
+                 'commissionAsset': base, 'tradeId': self._trade_id}
+        await self._send_execution_report(order, 'TRADE', trade)
+        await self._send_user_event({
+            'e': 'outboundAccountPosition', 'E': self._now(), 'u': self._now(),
+            'B': [{'a': asset, 'f': f"{self.balances[asset]:.8f}", 'l': '0.00000000'} for asset in (base, quote)],
+        })
+        return trade
+
+    async def _send_execution_report(self, order, execution, trade=None):
+        """https://binance-docs.github.io/apidocs/spot/en/#payload-order-update"""
+        now = self._now()
+        await self._send_user_event({
+            'e': 'executionReport', 'E': now, 's': order['symbol'], 'c': order['clientOrderId'],
+            'S': order['side'], 'o': order['type'], 'f': order['timeInForce'], 'q': order['origQty'],
+            'p': order['price'], 'P': order['stopPrice'], 'F': '0.00000000', 'g': -1, 'C': '',
+            'x': execution, 'X': order['status'], 'r': 'NONE', 'i': order['orderId'],
+            'l': trade['qty'] if trade else '0.00000000', 'z': order['executedQty'],
+            'L': trade['price'] if trade else '0.00000000', 'n': trade['commission'] if trade else '0',
+            'N': trade['commissionAsset'] if trade else None, 'T': now, 't': trade['tradeId'] if trade else -1,
+            'I': 0, 'w': order['status'] == 'NEW', 'm': False, 'M': trade is not None, 'O': order['time'],
+            'Z': order['cummulativeQuoteQty'], 'Y': f"{float(trade['qty']) * float(trade['price']):.8f}" if trade else '0.00000000',
+            'Q': '0.00000000', 'W': order['workingTime'], 'V': order['selfTradePreventionMode'],
+        })
+
+    # Sockets
+
+    async def _send(self, ws, msg):
+        try:
+            await ws.send_str(json.dumps(msg))
+            self.messages += 1
+        except ConnectionError:
+            pass
+
+    async def _send_user_event(self, event):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        for subscription_id, ws in list(self._user_sockets.items()):
+            await self._send(ws, {'subscriptionId': subscription_id, 'event': event})
+
+    async def _stream(self, request):
+        """Combined kline streams, /stream?streams=<symbol>@kline_<interval>/...
+        https://binance-docs.github.io/apidocs/spot/en/#websocket-market-streams"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        klines = {}  # stream: (symbol, interval, open time of the last kline sent)
+        for stream in request.query.get('streams', '').split('/'):
+            symbol, _, name = stream.partition('@')
+            if name.startswith('kline_') and symbol.upper() in self.symbols:
+                klines[stream] = [symbol.upper(), name[len('kline_'):], None]
+        sender = asyncio.create_task(self._send_klines(ws, klines))
+        try:
+            async for msg in ws:  # Only pongs and closes come from the client
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            sender.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+    async def _send_klines(self, ws, klines):
+        """stream_rate messages per second for each stream, the closing message of every kline included"""
+        start, sent = time.monotonic(), 0
+        while not ws.closed:
+            due = int((time.monotonic() - start) * self.stream_rate) - sent
+            for _ in range(due):
+                delay = self._delay()
+                if delay:
+                    await asyncio.sleep(delay)
+                now = self._now()
+                for stream, state in klines.items():
+                    symbol, interval, last_open = state
+                    interval_ms = interval_to_milliseconds(interval)
+                    open_time = now - now % interval_ms
+                    if last_open is not None and open_time > last_open:
+                        await self._send(ws, self._kline_message(stream, symbol, interval, last_open, None))
+                    state[2] = open_time
+                    await self._send(ws, self._kline_message(stream, symbol, interval, open_time, now))
+                sent += 1
+            await asyncio.sleep(min(0.01, 1 / self.stream_rate))
+
+    def _kline_message(self, stream, symbol, interval, open_time, now):
+        """https://binance-docs.github.io/apidocs/spot/en/#kline-candlestick-streams"""
+        k = self.kline(symbol, interval, open_time, now)
+        return {'stream': stream, 'data': {
+            'e': 'kline', 'E': now or self._now(), 's': symbol,
+            'k': {'t': k[0], 'T': k[6], 's': symbol, 'i': interval, 'f': -1, 'L': -1, 'o': k[1], 'c': k[4],
+                  'h': k[2], 'l': k[3], 'v': k[5], 'n': 0, 'x': now is None, 'q': k[7], 'V': '0', 'Q': '0', 'B': '0'},
+        }}
+
+    async def _ws_api(self, request):
+        """WebSocket API connection, only its user data stream subscription is served
+        https://developers.binance.com/docs/binance-spot-api-docs/websocket-api/user-data-stream-requests"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        subscriptions = []
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                req = json.loads(msg.data)
+                if req.get('method', '').startswith('userDataStream.subscribe'):
+                    subscription_id = next(self._subscription_ids)
+                    self._user_sockets[subscription_id] = ws
+                    subscriptions.append(subscription_id)
+                    await self._send(ws, {'id': req['id'], 'status': 200, 'result': {'subscriptionId': subscription_id}})
+                elif req.get('method') == 'userDataStream.unsubscribe':
+                    await self._send(ws, {'id': req['id'], 'status': 200, 'result': {}})
+                else:
+                    await self._send(ws, {'id': req.get('id'), 'status': 400,
+                                          'error': {'code': -1100, 'msg': f"Unsupported method {req.get('method')}"}})
+        finally:
+            for subscription_id in subscriptions:
+                self._user_sockets.pop(subscription_id, None)
+            self._sockets.discard(ws)
+        return ws
+
+
+class MockError(Exception):
+    """Binance API error returned by BinanceMockExchange"""
+
+    def __init__(self, code, msg):
+        Exception.__init__(self, msg)
+        self.code = code
+        self.msg = msg
@@ -0,0 +1,48 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP
+
+import numpy as np
+
+
+class BinanceQuantizer(object):
+    """Snaps prices or quantities to the tickSize / stepSize grid of a symbol filter
+    https://binance-docs.github.io/apidocs/spot/en/#filters"""
+    _NP_ROUNDING = {
+        ROUND_FLOOR: np.floor,
+        ROUND_CEILING: np.ceil,
+        ROUND_HALF_UP: lambda ticks: np.floor(ticks + 0.5),
+    }
+
+    def __init__(self, step, min_value='0', max_value='0', rounding=ROUND_FLOOR):
+        step = Decimal(step).normalize()
+        self.precision = max(-step.as_tuple().exponent, 0)  # decimals of the grid
+        self.scale = 10 ** self.precision
+        self.step = int(step * self.scale)  # grid step in units of 10 ** -precision, 0 when the filter is disabled
+        self.min_value = float(min_value)
+        self.max_value = float(max_value) or float('inf')  # 0 disables the limit
+        self.rounding = rounding
+
+    def ticks(self, value, rounding=None):
+        """Whole grid steps in value"""
+        ticks = Decimal(str(value)) * self.scale / self.step
+        return int(ticks.to_integral_value(rounding or self.rounding))
+
+    def format(self, value, rounding=None):
+        """value on the grid as the string sent to the exchange"""
+        if not self.step:  # No grid, sent as given
+            return format(Decimal(str(value)).normalize(), 'f')
+        units = self.ticks(value, rounding) * self.step
+        if not self.precision:
+            return str(units)
+        whole, fraction = divmod(abs(units), self.scale)
+        return f"{'-' if units < 0 else ''}{whole}.{fraction:0{self.precision}d}"
+
+    def quantize(self, values, rounding=None):
+        """Vectorized form: values snapped to the grid, and whether they are within the filter limits"""
+        if not self.step:  # No grid, only the limits apply
+            snapped = np.asarray(values, dtype=float)
+            return snapped, (snapped >= self.min_value) & (snapped <= self.max_value)
+        ticks = np.asarray(values, dtype=float) * self.scale / self.step
+        nearest = np.rint(ticks)
+        ticks = np.where(np.isclose(ticks, nearest, rtol=1e-12, atol=1e-9), nearest, ticks)  # float noise, e.g. 0.29 * 100
+        snapped = self._NP_ROUNDING[rounding or self.rounding](ticks) * self.step / self.scale
+        return snapped, (snapped >= self.min_value) & (snapped <= self.max_value)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from collections import deque
+
+
+class BinanceQueue(object):
+    """Bounded thread-safe FIFO from the socket threads to Cerebro, with an overflow policy and live counters"""
+    BLOCK, DROP_OLDEST, COALESCE = 'block', 'drop_oldest', 'coalesce'
+
+    def __init__(self, maxsize=0, policy=BLOCK, timeout=None):
+        if policy not in (self.BLOCK, self.DROP_OLDEST, self.COALESCE):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.maxsize = maxsize  # 0 is unbounded
+        self.policy = policy  # what a put does when the queue is full:
+        # block: waits for room, up to timeout seconds before dropping the oldest item
+        # drop_oldest: drops the oldest item
+        # coalesce: replaces the newest item, the latest value wins
+        self.timeout = timeout
+
+        self._items = deque()  # (item, key, monotonic put time)
+        self._not_full = threading.Condition()
+        self._consumer = None  # thread taking the items, it never blocks on its own puts
+
+        # Counters
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.coalesced = 0  # items replaced by a newer one, on overflow or by key
+        self.blocked = 0  # puts that had to wait for room
+        self.max_depth = 0
+        self.lag = 0.0  # seconds the last item taken waited in the queue
+        self.max_lag = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._items)
+
+    def put(self, item, key=None):
+        """Queues item, it replaces the newest item instead if both have the same key (not None)"""
+        with self._not_full:
+            self.puts += 1
+            if key is not None and self._items and self._items[-1][1] == key:
+                self._items[-1] = (item, key, self._items[-1][2])  # Keeps the lag of the replaced item
+                self.coalesced += 1
+                return
+
+            if self.full():
+                if self.policy == self.COALESCE:
+                    self._items[-1] = (item, key, self._items[-1][2])
+                    self.coalesced += 1
+                    return
+                drop = self.policy == self.DROP_OLDEST
+                if self.policy == self.BLOCK and threading.get_ident() != self._consumer:  # The consumer would wait for itself, it goes over maxsize
+                    self.blocked += 1
+                    drop = not self._not_full.wait_for(lambda: not self.full(), self.timeout)  # Timed out
+                if drop:
+                    self._items.popleft()
+                    self.dropped += 1
+
+            self._items.append((item, key, time.monotonic()))
+            self.max_depth = max(self.max_depth, len(self._items))
+
+    def get(self):
+        """Oldest item, None if the queue is empty"""
+        with self._not_full:
+            self._consumer = threading.get_ident()
+            if not self._items:
+                return None
+            item, _, put_time = self._items.popleft()
+            self.gets += 1
+            self.lag = time.monotonic() - put_time
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.policy == self.BLOCK:
+                self._not_full.notify()
+            return item
+
+    def stats(self):
+        return {
+            'depth': len(self._items),
+            'max_depth': self.max_depth,
+            'puts': self.puts,
+            'gets': self.gets,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked,
+            'lag': self.lag,
+            'max_lag': self.max_lag,
+        }
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+
+class BinanceRateLimiter(object):
+    """Request weight token bucket shared by every thread of a BinanceStore
+    https://binance-docs.github.io/apidocs/spot/en/#limits"""
+
+    def __init__(self, weight_limit=6000, interval=60):
+        self.weight_limit = weight_limit  # REQUEST_WEIGHT allowed per interval
+        self.interval = interval  # seconds
+
+        self._weight = weight_limit  # available weight
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._weight = min(self.weight_limit, self._weight + (now - self._updated) * self.weight_limit / self.interval)
+        self._updated = now
+
+    @property
+    def available(self):
+        """Request weight that can be taken now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._weight
+
+    def _take(self, weight):
+        """Takes weight from the bucket if available, else returns the seconds to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self._blocked_until - now, (weight - self._weight) * self.interval / self.weight_limit)
+            if wait <= 0:
+                self._weight -= weight
+            return wait
+
+    def acquire(self, weight=1):
+        """Takes weight from the bucket, blocks only while it is exhausted or backing off"""
+        while (wait := self._take(weight)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, weight=1):
+        """acquire for the event loop, awaits instead of blocking the thread"""
+        while (wait := self._take(weight)) > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, used_weight):
+        """Syncs the bucket with the X-MBX-USED-WEIGHT-1M header"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._weight = min(self._weight, self.weight_limit - used_weight)
+
+    def backoff(self, seconds):
+        """Holds every request for seconds, after 429 and 418 responses"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
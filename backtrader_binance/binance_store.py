@@ -1,19 +1,109 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
 import time
 
-from functools import wraps
-from math import floor
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP
+from functools import partial, wraps
+
+import numpy as np
 
 from backtrader.dataseries import TimeFrame
-from binance import Client, ThreadedWebsocketManager
+from binance import AsyncClient, Client, ThreadedWebsocketManager
 from binance.enums import *
 from binance.exceptions import BinanceAPIException
+from binance.helpers import interval_to_milliseconds
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectTimeout, ConnectionError
 
 from .binance_broker import BinanceBroker
 from .binance_feed import BinanceData
+from .binance_journal import BinanceJournal, BinanceReplaySocketManager
+from .binance_latency import BinanceLatencyTracer
+from .binance_metrics import BinanceMetrics
+from .binance_orderbook import BinanceOrderBook
+from .binance_quantizer import BinanceQuantizer
+from .binance_rate_limiter import BinanceRateLimiter
+from .binance_tick_feed import BinanceBookTickerData, BinanceTradeData
+
+
+class BinanceWebsocketManager(ThreadedWebsocketManager):
+    """ThreadedWebsocketManager running its own event loop, whose client and streams can be pointed at the store's base_url.
+    By default every manager started from a thread shares its event loop, a second store couldn't open its sockets.
+    It overrides private methods of python-binance 1.0.37, the version pinned in requirements.txt and setup.py"""
+
+    def __init__(self, store, *args, **kwargs):
+        kwargs.setdefault('loop', asyncio.new_event_loop())
+        ThreadedWebsocketManager.__init__(self, *args, **kwargs)
+        self._store = store
+
+    def run(self):
+        try:
+            self._loop.run_until_complete(self.socket_listener())
+        finally:
+            self._loop.run_until_complete(self._shutdown())
+            self._loop.close()
+
+    def stop(self):
+        """Ends the sockets and the client on the manager's thread, without waiting for them"""
+        if not self._running:
+            return
+        self._running = False
+        self._loop.call_soon_threadsafe(self._cancel_listeners)
+
+    def _cancel_listeners(self):
+        for task in asyncio.all_tasks(self._loop):
+            if task.get_coro().__name__ == 'start_listener':
+                task.cancel()
+        self._socket_running.clear()  # Cancelled listeners don't remove their socket
+
+    async def _shutdown(self):
+        if self._client is not None:
+            try:  # The WebSocket API connection of the user socket may not close cleanly
+                await asyncio.wait_for(self._client.close_connection(), 1)
+            except (Exception, asyncio.CancelledError):
+                pass
+        tasks = [task for task in asyncio.all_tasks(self._loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start_async_socket(self, callback, socket_name, params, path=None):
+        """Creates the socket on the manager's loop, python-binance binds it to the loop of the calling thread"""
+        deadline = time.monotonic() + 5
+        while not self._bsm:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError("Binance socket manager failed to start")
+            time.sleep(0.1)
+
+        async def start():
+            socket = getattr(self._bsm, socket_name)(**params)
+            socket_path = path or socket._path
+            self._socket_running[socket_path] = True
+            asyncio.ensure_future(self.start_listener(socket, socket_path, callback))
+            return socket_path
+        return asyncio.run_coroutine_threadsafe(start(), self._loop).result()
+
+    async def socket_listener(self):
+        if self._store.base_url is None:
+            return await ThreadedWebsocketManager.socket_listener(self)
+
+        self._client = self._store._redirect(AsyncClient(loop=self._loop, **self._client_params))
+        await self._before_socket_listener_start()
+        self._bsm.STREAM_URL = f"{self._store._ws_url}/"
+        while self._running:
+            await asyncio.sleep(0.2)
+        while self._socket_running:
+            await asyncio.sleep(0.2)
 
 
 class BinanceStore(object):
+    BrokerCls = BinanceBroker
+    DataCls = BinanceData
+
     _GRANULARITIES = {
         (TimeFrame.Minutes, 1): KLINE_INTERVAL_1MINUTE,
         (TimeFrame.Minutes, 3): KLINE_INTERVAL_3MINUTE,
@@ -32,53 +122,233 @@ class BinanceStore(object):
         (TimeFrame.Months, 1): KLINE_INTERVAL_1MONTH,
     }
 
-    def __init__(self, api_key, api_secret, coin_target, testnet=False, retries=5, tld='com'):  # coin_refer, coin_target
-        self.binance = Client(api_key, api_secret, testnet=testnet, tld=tld)
-        self.binance_socket = ThreadedWebsocketManager(api_key, api_secret, testnet=testnet)
-        self.binance_socket.daemon = True
-        self.binance_socket.start()
+    _KLINE_DTYPE = np.dtype([
+        ('timestamp', '<i8'),  # open time in ms
+        ('open', '<f8'),
+        ('high', '<f8'),
+        ('low', '<f8'),
+        ('close', '<f8'),
+        ('volume', '<f8'),
+    ])
+    _KLINES_LIMIT = 1000  # max klines per request
+    _CACHE_BLOCK = 50  # requests downloaded between cache writes
+    _CONNECT_RETRY_DELAY = 0.5  # seconds before retrying after a connection error, doubled on every attempt
+    _WEIGHTS = {  # request weight of the store methods, https://binance-docs.github.io/apidocs/spot/en/#limits
+        'cancel_open_orders': 7,  # openOrders + DELETE openOrders
+        'cancel_order': 1,
+        'create_order': 1,
+        'get_account': 20,
+        'get_exchange_info': 20,
+        'get_klines': 2,
+        'get_order_book': 50,  # limit 1000
+    }
+
+    def __init__(self, api_key, api_secret, coin_target, testnet=False, retries=5, tld='com',
+                 download_workers=4, cache_dir=None, streams_per_connection=200, weight_limit=6000,
+                 symbols_info_ttl=3600, balance_reconcile_interval=300, offline=False, http_pool_size=10,
+                 base_url=None, journal=None, replay=None, replay_speed=0.0, trace_latency=False,
+                 metrics_labels=None):  # coin_refer, coin_target
+        # Client and sockets are created on first use, offline never touches the network
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self.testnet = testnet
+        self.tld = tld
+        self.replay = replay  # BinanceJournal the sockets are replayed from, instead of Binance
+        self.replay_speed = replay_speed  # 0 replays as fast as the feeds take it, 1 at the original pacing
+        self.replay_time = None  # receive time (ms) of the message being replayed
+        self.replay_done = threading.Event()
+        self.offline = offline or replay is not None  # A replayed session never reaches Binance
+        self.base_url = base_url.rstrip('/') if base_url else None  # e.g. a BinanceMockExchange url instead of Binance
+        self._ws_url = 'ws' + self.base_url[4:] if self.base_url else None  # http(s):// -> ws(s)://
+        self.http_pool_size = http_pool_size  # keep-alive connections per host, shared by every thread
+        self._session = None  # pooled session of every client
+        self._clients = threading.local()  # one Client per thread, so slow requests don't block other threads
+        self._timestamp_offset = 0  # ms from the local clock to Binance's server, shared by every client
+        self._binance_socket = None
+        self._connect_lock = threading.Lock()
+        self._journal = BinanceJournal(journal) if journal else None  # every socket message received is recorded
+        self.tracer = BinanceLatencyTracer() if trace_latency else None  # hop latencies from kline close to fill
+        self.metrics = BinanceMetrics(metrics_labels)  # read by the exporters started with metrics.export
+        self._rest_requests = self.metrics.counter('binance_rest_requests_total', "REST requests sent, retries included", ('endpoint',))
+        self._rest_errors = self.metrics.counter('binance_rest_errors_total', "REST requests failed", ('endpoint', 'code'))
+        self._rest_retries = self.metrics.counter('binance_rest_retries_total', "REST requests retried", ('endpoint',))
+        self._timestamp_resyncs = self.metrics.counter('binance_timestamp_resyncs_total', "Clock offsets resynced after -1021 errors")
+        self._ws_messages = self.metrics.counter('binance_ws_messages_total', "Socket messages received", ('stream',))
         # self.coin_refer = coin_refer
         self.coin_target = coin_target  # USDT
         # self.symbol = coin_refer + coin_target
-        self.symbols = []  # symbols
+        self.symbols = set()  # symbols
         self.retries = retries
+        self.download_workers = download_workers
+        self.cache_dir = cache_dir  # on-disk klines cache, one file per symbol and interval
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._limiter = BinanceRateLimiter(weight_limit)
+        self.metrics.gauge('binance_rest_weight_available', "Request weight left in the rate limiter bucket").track(
+            lambda: {(): self._limiter.available})
 
         self._cash = 0
         self._value = 0
-        self.get_balance()
+        self.balance_reconcile_interval = balance_reconcile_interval  # seconds between REST snapshots of the balances
+        self._balances = {}  # asset: (free, locked, update time), kept current by the user data stream
+        self._balances_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.symbols_info_ttl = symbols_info_ttl  # seconds before the exchangeInfo registry is reloaded
+        self._symbols_info = {}  # symbol: exchangeInfo entry, shared by every feed and the broker
+        self._symbols_info_time = None
+        self._symbols_info_lock = threading.Lock()
 
         self._step_size = {}
         self._min_order = {}
         self._min_order_in_target = {}
         self._tick_size = {}
+        self._price_quantizer = {}
+        self._quantity_quantizer = {}
+
+        self.streams_per_connection = streams_per_connection
+        self._streams = {}  # stream name: callbacks, served by combined stream connections
+        self._started_streams = set()
+        self.new_kline = threading.Condition()  # notified by the feeds whenever a live kline is queued, and by the broker's notifications
+        self.new_kline_time = 0.0  # monotonic time of the last one
 
-        self._broker = BinanceBroker(store=self)
+        self._broker = self.BrokerCls(store=self)
         self._data = None
         self._datas = {}
+        self._order_books = {}
+        self._track_feed_queues()
+
+    def _track_feed_queues(self):
+        """Queue counters of the feeds created by getdata, read from their BinanceQueue stats on collect"""
+        queue_stats = lambda key: {(name,): data._data.stats()[key] for name, data in list(self._datas.items())}
+        for key, kind, help in (
+                ('depth', 'gauge', "Live klines waiting for Cerebro"),
+                ('max_depth', 'gauge', "Most live klines ever waiting for Cerebro"),
+                ('lag', 'gauge', "Seconds the last kline taken waited in the queue"),
+                ('max_lag', 'gauge', "Most seconds a kline waited in the queue"),
+                ('dropped', 'counter', "Klines dropped by a full queue"),
+                ('coalesced', 'counter', "Klines replaced by a newer one"),
+                ('blocked', 'counter', "Socket puts that waited for room")):
+            name = f"binance_feed_queue_{key}" + ('_total' if kind == 'counter' else '') + ('_seconds' if 'lag' in key else '')
+            getattr(self.metrics, kind)(name, help, ('feed',)).track(partial(queue_stats, key))
+
+    @property
+    def binance(self):
+        """Client of the calling thread, all of them send their requests on the same connection pool"""
+        client = getattr(self._clients, 'client', None)
+        if client is None:
+            with self._connect_lock:
+                if self.offline:
+                    raise RuntimeError("BinanceStore is offline")
+                try:
+                    asyncio.get_event_loop_policy().get_event_loop()
+                    thread_loop = True
+                except RuntimeError:  # Worker thread without an event loop, Client sets it one
+                    thread_loop = False
+                client = Client(self._api_key, self._api_secret, testnet=self.testnet, tld=self.tld,
+                                ping=self._session is None and self.base_url is None)  # DNS and SSL are set up once
+                if not thread_loop:
+                    # Only its websocket API methods run on it, closed or the loop leaks its sockets when the thread ends
+                    asyncio.set_event_loop(None)
+                    client.loop.close()
+                self._redirect(client)
+                if self._session is None:
+                    # pool_block caps the connections per host, extra requests wait for a free one
+                    adapter = HTTPAdapter(pool_maxsize=self.http_pool_size, pool_block=True)
+                    client.session.mount('https://', adapter)
+                    self._session = client.session
+                else:
+                    client.session.close()
+                    client.session = self._session
+            self._clients.client = client
+        client.timestamp_offset = self._timestamp_offset
+        return client
+
+    @property
+    def streaming(self):
+        """Sockets are available, live or replayed"""
+        return not self.offline or self.replay is not None
+
+    @property
+    def binance_socket(self):
+        if self._binance_socket is None:
+            with self._connect_lock:
+                if not self.streaming:
+                    raise RuntimeError("BinanceStore is offline")
+                if self._binance_socket is None and self.replay is not None:
+                    self._binance_socket = BinanceReplaySocketManager(self, self.replay, self.replay_speed)
+                elif self._binance_socket is None:
+                    binance_socket = BinanceWebsocketManager(self, self._api_key, self._api_secret, testnet=self.testnet)
+                    binance_socket.daemon = True
+                    binance_socket.start()
+                    self._binance_socket = binance_socket
+        return self._binance_socket
+
+    def time_ms(self):
+        """Current time (ms), the receive time of the message being replayed when replaying a journal"""
+        return self.replay_time if self.replay_time is not None else int(time.time() * 1000)
+
+    def _redirect(self, client):
+        """Points the REST and WebSocket API requests of client at base_url"""
+        if self.base_url is not None:
+            client.API_URL = f"{self.base_url}/api"
+            client.ws_api._url = f"{self._ws_url}/ws-api/v3"
+        return client
+
+    def _cache_path(self, symbol, interval, kind='klines'):
+        return os.path.join(self.cache_dir, f'{symbol}_{interval}.{kind}')
 
-    def _format_value(self, value, step):
-        precision = step.find('1') - 1
-        if precision > 0:
-            return '{:0.0{}f}'.format(float(value), precision)
-        return floor(value)
-        
     def retry(func):
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             for attempt in range(1, self.retries + 1):
-                time.sleep(60 / 1200) # API Rate Limit
+                self._limiter.acquire(self._WEIGHTS.get(func.__name__, 1)) # API Rate Limit
+                self._rest_requests.inc(func.__name__)
                 try:
-                    return func(self, *args, **kwargs)
+                    result = func(self, *args, **kwargs)
                 except (BinanceAPIException, ConnectTimeout, ConnectionError) as err:
-                    if isinstance(err, BinanceAPIException) and err.code == -1021:
-                        # Recalculate timestamp offset between local and Binance's server
-                        res = self.binance.get_server_time()
-                        self.binance.timestamp_offset = res['serverTime'] - int(time.time() * 1000)
-                    
+                    if isinstance(err, BinanceAPIException):  # Error responses report the weight too
+                        self._update_used_weight(err.response)
+                    delay = self._request_failed(func.__name__, err, attempt)
+                    if delay is None:
+                        self._resync_timestamp(self.binance.get_server_time())
                     if attempt == self.retries:
                         raise
+                    self._rest_retries.inc(func.__name__)
+                    if delay:
+                        time.sleep(delay)
+                else:
+                    # Not self.binance, which raises when offline or when no client could be built
+                    client = getattr(self._clients, 'client', None)
+                    self._update_used_weight(client.response if client is not None else None)
+                    return result
         return wrapper
 
+    def _request_failed(self, name, err, attempt):
+        """Counts the error of request name on its attempt, returns the seconds to wait before the next one,
+        None if the timestamp offset has to be resynced first"""
+        self._rest_errors.inc(name, getattr(err, 'code', type(err).__name__))
+        if not isinstance(err, BinanceAPIException):  # Connection error, give the network time to come back
+            return self._CONNECT_RETRY_DELAY * 2 ** (attempt - 1)
+        if err.code == -1021:  # Timestamp outside of recvWindow
+            return None
+        if err.status_code in (418, 429):
+            # Rate limit hit (429) or IP banned for it (418), pause every request
+            retry_after = err.response.headers.get('Retry-After')
+            self._limiter.backoff(max(float(retry_after or 0), 2 ** attempt))
+        return 0
+
+    def _resync_timestamp(self, server_time):
+        """Recalculates the timestamp offset between local and Binance's server from a GET /api/v3/time response"""
+        self._timestamp_offset = server_time['serverTime'] - int(time.time() * 1000)
+        self._timestamp_resyncs.inc()
+
+    def _update_used_weight(self, response):
+        """Syncs the limiter with the X-MBX-USED-WEIGHT-1M header of the last response, if one arrived"""
+        used_weight = response.headers.get('x-mbx-used-weight-1m') if response is not None else None
+        if used_weight:
+            self._limiter.update(int(used_weight))
+
     @retry
     def cancel_open_orders(self, symbol):
         orders = self.binance.get_open_orders(symbol=symbol)
@@ -86,9 +356,12 @@ class BinanceStore(object):
             self.binance._request_api('delete', 'openOrders', signed=True, data={ 'symbol': symbol })
 
     @retry
-    def cancel_order(self, symbol, order_id):
+    def cancel_order(self, symbol, order_id=None, client_order_id=None):
         try:
-            self.binance.cancel_order(symbol=symbol, orderId=order_id)
+            if order_id is None:
+                self.binance.cancel_order(symbol=symbol, origClientOrderId=client_order_id)
+            else:
+                self.binance.cancel_order(symbol=symbol, orderId=order_id)
         except BinanceAPIException as api_err:
             if api_err.code == -2011:  # Order filled
                 return
@@ -99,6 +372,9 @@ class BinanceStore(object):
     
     @retry
     def create_order(self, symbol, side, type, size, price, **params):
+        return self.binance.create_order(**self._order_params(symbol, side, type, size, price, **params))
+
+    def _order_params(self, symbol, side, type, size, price, **params):
         if type == None: type = ORDER_TYPE_MARKET
 
         if type != ORDER_TYPE_MARKET:
@@ -117,7 +393,7 @@ class BinanceStore(object):
         
         if size is not None: size = self.format_quantity(symbol, size)
                 
-        return self.binance.create_order(
+        return dict(
             symbol=symbol,
             side=side,
             type=type,
@@ -126,26 +402,71 @@ class BinanceStore(object):
             **params)
 
     def format_price(self, symbol, price):
-        return self._format_value(price, self._tick_size[symbol])
+        self._refresh_symbols_info()  # Filters change while a live session runs
+        return self._price_quantizer[symbol].format(price)
     
     def format_quantity(self, symbol, size):
-        return self._format_value(size, self._step_size[symbol])
+        self._refresh_symbols_info()
+        return self._quantity_quantizer[symbol].format(size)
+
+    def quantize_prices(self, symbol, prices):
+        """Prices array snapped to the symbol ticks, and whether each one passes PRICE_FILTER"""
+        self._refresh_symbols_info()
+        return self._price_quantizer[symbol].quantize(prices)
+
+    def quantize_quantities(self, symbol, sizes):
+        """Sizes array snapped down to the symbol steps, and whether each one passes LOT_SIZE"""
+        self._refresh_symbols_info()
+        return self._quantity_quantizer[symbol].quantize(sizes)
 
     @retry
+    def get_account(self):
+        return self.binance.get_account()
+
+    def load_balances(self):
+        """Snapshot of every asset balance from a single account request, merged asset by asset:
+        a balance the user data stream updated after the snapshot was taken is kept"""
+        account = self.get_account()
+        update_time = account.get('updateTime', 0)
+        snapshot = {b['asset']: (float(b['free']), float(b['locked']), update_time) for b in account['balances']}
+        with self._balances_lock:
+            for asset in set(self._balances) | set(snapshot):
+                if asset not in self._balances or self._balances[asset][2] <= update_time:
+                    self._balances[asset] = snapshot.get(asset, (0.0, 0.0, update_time))  # Missing assets are empty
+
+    def update_balances(self, msg):
+        """https://binance-docs.github.io/apidocs/spot/en/#payload-account-update"""
+        with self._balances_lock:
+            if msg['e'] == 'outboundAccountPosition':
+                for b in msg['B']:
+                    self._balances[b['a']] = (float(b['f']), float(b['l']), msg['u'])
+            elif msg['e'] == 'balanceUpdate':
+                free, locked, update_time = self._balances.get(msg['a'], (0.0, 0.0, 0))
+                if msg['T'] > update_time:  # Not counted by an account position yet
+                    self._balances[msg['a']] = (free + float(msg['d']), locked, msg['T'])
+
+    def start_balance_reconcile(self):
+        """Reloads the balances snapshot every balance_reconcile_interval seconds in the background"""
+        threading.Thread(target=self._reconcile_balances, daemon=True).start()
+
+    def _reconcile_balances(self):
+        while not self._stopped.wait(self.balance_reconcile_interval):
+            try:
+                self.load_balances()
+            except (BinanceAPIException, ConnectTimeout, ConnectionError) as e:
+                print("Exception (balances not reconciled):", e)
+
     def get_asset_balance(self, asset):
-        balance = self.binance.get_asset_balance(asset)
-        return float(balance['free']), float(balance['locked'])
+        if not self._balances and not self.offline:  # First use
+            self.load_balances()
+        free, locked, _ = self._balances.get(asset, (0.0, 0.0, 0))
+        return free, locked
 
     def get_symbol_balance(self, symbol):
         """Get symbol balance in symbol"""
-        balance = 0
-        try:
-            symbol = symbol[0:len(symbol)-len(self.coin_target)]
-            balance = self.binance.get_asset_balance(symbol)
-            balance = float(balance['free'])
-        except Exception as e:
-            print("Error:", e)
-        return balance, symbol  # float(balance['locked'])
+        symbol = symbol[0:len(symbol)-len(self.coin_target)]
+        free, _ = self.get_asset_balance(symbol)
+        return free, symbol  # locked
 
     def get_balance(self, ):
         """Balance in USDT for example - in coin target"""
@@ -153,36 +474,292 @@ class BinanceStore(object):
         self._cash = free
         self._value = free + locked
 
-    def getbroker(self):
+    def getbroker(self, **kwargs):  # async_orders=False, order_workers=4
+        for name, value in kwargs.items():
+            setattr(self._broker.p, name, value)
         return self._broker
 
     def getdata(self, **kwargs):  # timeframe, compression, start_date=None, LiveBars=True
         symbol = kwargs['dataname']
         tf = self.get_interval(kwargs['timeframe'], kwargs['compression'])
-        self.symbols.append(symbol)
-        self.get_filters(symbol=symbol)
-        if symbol not in self._datas:
-            self._datas[f"{symbol}{tf}"] = BinanceData(store=self, **kwargs)  # timeframe=timeframe, compression=compression, start_date=start_date, LiveBars=LiveBars
-        return self._datas[f"{symbol}{tf}"]
+        self.symbols.add(symbol)
+        self.get_symbol_info(symbol)  # Loads the symbols registry with their filters
+        key = f"{symbol}{tf}"
+        if key not in self._datas:
+            self._datas[key] = self.DataCls(store=self, **kwargs)  # timeframe=timeframe, compression=compression, start_date=start_date, LiveBars=LiveBars
+        return self._datas[key]
         
+    def gettrades(self, **kwargs):  # dataname, bar_seconds=0
+        return self._gettickdata(BinanceTradeData, **kwargs)
+
+    def getbookticker(self, **kwargs):  # dataname, bar_seconds=0
+        return self._gettickdata(BinanceBookTickerData, **kwargs)
+
+    def _gettickdata(self, cls, **kwargs):
+        symbol = kwargs['dataname']
+        self.symbols.add(symbol)
+        self.get_symbol_info(symbol)
+        key = f"{symbol}@{cls._STREAM}{kwargs.get('bar_seconds', 0)}"
+        if key not in self._datas:
+            self._datas[key] = cls(store=self, **kwargs)
+        return self._datas[key]
+
     def get_filters(self, symbol):
-        symbol_info = self.get_symbol_info(symbol)
+        self._load_filters(self.get_symbol_info(symbol))
+
+    def _load_filters(self, symbol_info):
+        symbol = symbol_info['symbol']
         for f in symbol_info['filters']:
             if f['filterType'] == 'LOT_SIZE':
                 self._step_size[symbol] = f['stepSize']
                 self._min_order[symbol] = f['minQty']
+                self._quantity_quantizer[symbol] = BinanceQuantizer(f['stepSize'], f['minQty'], f['maxQty'])
             elif f['filterType'] == 'PRICE_FILTER':
                 self._tick_size[symbol] = f['tickSize']
-            elif f['filterType'] == 'NOTIONAL':
+                self._price_quantizer[symbol] = BinanceQuantizer(f['tickSize'], f['minPrice'], f['maxPrice'], ROUND_HALF_UP)
+            elif f['filterType'] in ('NOTIONAL', 'MIN_NOTIONAL'):
                 self._min_order_in_target[symbol] = f['minNotional']
 
     def get_interval(self, timeframe, compression):
         return self._GRANULARITIES.get((timeframe, compression))
 
     @retry
+    def get_klines(self, symbol, interval, start_time, end_time=None, limit=_KLINES_LIMIT):
+        return self.binance.get_klines(symbol=symbol, interval=interval, startTime=start_time, endTime=end_time, limit=limit)
+
+    def get_historical_klines(self, symbol, interval, start_time, end_time=None):
+        """Klines from start_time to end_time (ms), downloaded in parallel windows and returned ordered by open time"""
+        interval_ms = interval_to_milliseconds(interval)
+        if interval_ms is None:  # Months have no fixed length, page through them sequentially
+            klines = []
+            while True:
+                chunk = self.get_klines(symbol, interval, start_time, end_time)
+                klines += chunk
+                if len(chunk) < self._KLINES_LIMIT:
+                    return klines
+                start_time = chunk[-1][0] + 1
+
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+        window = interval_ms * self._KLINES_LIMIT
+        if end_time - start_time >= window:  # Skip windows before the first kline ever available for the symbol
+            first = self.get_klines(symbol, interval, 0, limit=1)
+            if first:
+                start_time = max(start_time, first[0][0])
+
+        windows = [(t, min(t + window - 1, end_time)) for t in range(start_time, end_time + 1, window)]
+        with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+            chunks = pool.map(lambda w: self.get_klines(symbol, interval, *w), windows)
+            klines = {kline[0]: kline for chunk in chunks for kline in chunk}  # Windows may overlap on retries
+        return [klines[t] for t in sorted(klines)]
+
+    def _klines_to_array(self, klines):
+        return np.array([tuple(kline[:6]) for kline in klines], dtype=self._KLINE_DTYPE)
+
+    def _read_cache(self, path):
+        size = os.path.getsize(path) // self._KLINE_DTYPE.itemsize if os.path.exists(path) else 0
+        if not size:
+            return np.empty(0, self._KLINE_DTYPE)
+        return np.memmap(path, dtype=self._KLINE_DTYPE, mode='r', shape=(size,))
+
+    def _download_to_cache(self, f, symbol, interval, start_time, end_time, now):
+        """Writes closed klines from start_time to end_time (ms) to the cache file f block by block, returns the klines still open"""
+        interval_ms = interval_to_milliseconds(interval)
+        block = interval_ms * self._KLINES_LIMIT * self._CACHE_BLOCK if interval_ms else end_time - start_time + 1
+        opened = []
+        for t in range(start_time, end_time + 1, block):
+            klines = self.get_historical_klines(symbol, interval, t, min(t + block - 1, end_time))
+            self._klines_to_array([kline for kline in klines if kline[6] < now]).tofile(f)
+            opened += [kline for kline in klines if kline[6] >= now]
+        return opened
+
+    def _update_cache(self, symbol, interval, start_time):
+        """Downloads the klines missing in the cache since start_time (ms), returns the klines still open.
+        The cache is rewritten aside and renamed over the old one, so a crash or another process sharing cache_dir
+        never leaves a partial record in it"""
+        path = self._cache_path(symbol, interval)
+        cached = self._read_cache(path)  # Whole records only, a partial one left by a crash is dropped
+        now = int(time.time() * 1000)
+        opened = []
+        if self.offline:
+            return self._klines_to_array(opened)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=os.path.basename(path) + '.', suffix='.tmp')
+        head = False  # the klines before the cached ones are in tmp
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                try:
+                    interval_ms = interval_to_milliseconds(interval) or 1
+                    if not len(cached) or cached['timestamp'][0] - start_time >= interval_ms:  # start_time may be before the listing
+                        start_time = max(start_time, self._first_open_time(symbol, interval))
+                    if len(cached) and cached['timestamp'][0] - start_time >= interval_ms:
+                        self._download_to_cache(f, symbol, interval, start_time, int(cached['timestamp'][0]) - 1, now)
+                    head = True
+                    cached.tofile(f)
+                    tail_start = int(cached['timestamp'][-1]) + 1 if len(cached) else start_time
+                    opened = self._download_to_cache(f, symbol, interval, tail_start, now, now)
+                except (BinanceAPIException, ConnectTimeout, ConnectionError) as e:
+                    print(f"Exception (using cached klines for {symbol} {interval}):", e)
+            if head:  # The tail blocks downloaded before an error are kept
+                os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return self._klines_to_array(opened)
+
+    def _first_open_time(self, symbol, interval):
+        """Open time (ms) of the first kline of symbol ever, 0 if it has none yet.
+        Probed once, then read from next to the cache, so the head before the listing isn't downloaded on every run"""
+        path = self._cache_path(symbol, interval, 'first')
+        try:
+            with open(path) as f:
+                return int(f.read())
+        except (OSError, ValueError):  # Not probed yet, or being written by another store
+            pass
+        first = self.get_klines(symbol, interval, 0, limit=1)
+        if not first:
+            return 0
+        with open(path, 'w') as f:
+            f.write(str(first[0][0]))
+        return first[0][0]
+
+    def map_klines(self, symbol, interval, start_time):
+        """Closed klines from start_time (ms) memory-mapped from the cache, and the klines still open"""
+        opened = self._update_cache(symbol, interval, start_time)
+        cached = self._read_cache(self._cache_path(symbol, interval))
+        return cached[np.searchsorted(cached['timestamp'], start_time):], opened
+
+    def load_klines(self, symbol, interval, start_time):
+        """Klines from start_time (ms) up to now as a _KLINE_DTYPE array, the newest kline may still be open"""
+        if not self.cache_dir:
+            if self.offline:
+                print(f"Offline store without cache_dir has no klines for {symbol} {interval}")
+                return self._klines_to_array([])
+            return self._klines_to_array(self.get_historical_klines(symbol, interval, start_time))
+        return np.concatenate(self.map_klines(symbol, interval, start_time))
+
+    @retry
+    def get_exchange_info(self):
+        return self.binance.get_exchange_info()
+
+    def load_symbols_info(self):
+        """Fills the symbols registry and their filters from a single exchangeInfo request, kept in cache_dir for offline use"""
+        path = os.path.join(self.cache_dir, 'exchangeInfo.json') if self.cache_dir else None
+        if self.offline:
+            if path is None or not os.path.exists(path):
+                return
+            with open(path) as f:
+                exchange_info = json.load(f)
+        else:
+            exchange_info = self.get_exchange_info()
+            if path is not None:
+                with open(path, 'w') as f:
+                    json.dump(exchange_info, f)
+
+        for symbol_info in exchange_info['symbols']:
+            self._symbols_info[symbol_info['symbol']] = symbol_info
+            self._load_filters(symbol_info)
+        self._symbols_info_time = time.monotonic()
+
+    def _refresh_symbols_info(self):
+        """Reloads the registry once symbols_info_ttl is over, a failed reload keeps the filters loaded before"""
+        with self._symbols_info_lock:
+            if self._symbols_info_time is None:
+                self.load_symbols_info()
+            elif time.monotonic() - self._symbols_info_time > self.symbols_info_ttl:
+                try:
+                    self.load_symbols_info()
+                except Exception as e:
+                    print("Exception (symbols info not reloaded):", e)
+
     def get_symbol_info(self, symbol):
-        return self.binance.get_symbol_info(symbol)
+        self._refresh_symbols_info()
+        if self.offline and symbol not in self._symbols_info:
+            return {'symbol': symbol, 'filters': []}
+        return self._symbols_info.get(symbol)
+
+    def subscribe(self, stream, callback):
+        """Registers callback for the stream payloads, the connection is opened by start_streams"""
+        self._streams.setdefault(stream, []).append(callback)
+
+    def start_streams(self):
+        """Opens combined stream connections for every stream subscribed and not started yet"""
+        streams = [stream for stream in self._streams if stream not in self._started_streams]
+        for i in range(0, len(streams), self.streams_per_connection):
+            connection_streams = streams[i:i + self.streams_per_connection]
+            self.binance_socket.start_multiplex_socket(
+                partial(self._handle_multiplex_socket_message, streams=connection_streams),
+                connection_streams)
+            self._started_streams.update(connection_streams)
+
+    def start_user_socket(self, callback):
+        """Opens the user data stream for callback"""
+        self.binance_socket.start_user_socket(partial(self._handle_user_socket_message, callback=callback))
+
+    def _received(self, channel, stream, msg):
+        """Counts and journals a socket message, False once the sockets are stopped: closing sockets report errors"""
+        if self._stopped.is_set():
+            return False
+        self._ws_messages.inc(stream)
+        if self._journal is not None:
+            self._journal.write(channel, msg)
+        return True
+
+    def _handle_user_socket_message(self, msg, callback):
+        if self._received(BinanceJournal.USER, 'user', msg):
+            return callback(msg)
+
+    def _stream_calls(self, msg, streams):
+        """[(callback, payload)] of a combined stream message"""
+        if not self._received(BinanceJournal.MARKET, msg.get('stream', 'error'), msg):
+            return []
+        if 'stream' in msg:
+            return [(callback, msg['data']) for callback in self._streams[msg['stream']]]
+        if msg['e'] == 'error':  # Errors belong to every stream of the connection
+            return [(callback, msg) for stream in streams for callback in self._streams[stream]]
+        return []
+
+    def _handle_multiplex_socket_message(self, msg, streams):
+        """https://binance-docs.github.io/apidocs/spot/en/#websocket-market-streams"""
+        for callback, payload in self._stream_calls(msg, streams):
+            callback(payload)
+
+    @retry
+    def get_order_book(self, symbol, limit=1000):
+        return self.binance.get_order_book(symbol=symbol, limit=limit)
+
+    def getorderbook(self, symbol):
+        """Local order book of symbol, kept from a snapshot and the <symbol>@depth@100ms stream"""
+        if symbol not in self._order_books:
+            book = BinanceOrderBook(symbol)
+            self._order_books[symbol] = book
+            self.subscribe(f"{symbol.lower()}@depth@100ms", partial(self._handle_depth_socket_message, book=book))
+            if self.streaming:  # Synced from now on, not only once the feeds go live
+                self.start_streams()
+        return self._order_books[symbol]
+
+    def _handle_depth_socket_message(self, msg, book):
+        """https://binance-docs.github.io/apidocs/spot/en/#diff-depth-stream"""
+        if msg['e'] == 'depthUpdate':
+            # A replayed session has no REST snapshot to sync from, its books stay unsynced
+            if book.update(msg) and not self.offline:
+                threading.Thread(target=self._load_order_book_snapshot, args=(book,), daemon=True).start()
+        # Errors need nothing, the events missed meanwhile show up as an update id gap and resync the book
+
+    def _load_order_book_snapshot(self, book):
+        """Requests snapshots until one lines up with the buffered events, off the socket thread"""
+        while not self._stopped.is_set():
+            try:
+                if book.load_snapshot(self.get_order_book(book.symbol)):
+                    return
+            except Exception as e:
+                print("Exception (order book snapshot):", e)
+            self._stopped.wait(1)
 
     def stop_socket(self):
-        self.binance_socket.stop()
-        self.binance_socket.join(5)
\ No newline at end of file
+        self._stopped.set()
+        if self._binance_socket is not None:
+            self._binance_socket.stop()
+            self._binance_socket.join(5)
+        if self._journal is not None:
+            self._journal.close()
+        self.metrics.stop()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import threading
+
+from backtrader.feed import DataBase
+
+from backtrader import TimeFrame as tf
+
+from .binance_feed import BinanceData
+from .binance_journal import RECONNECT_ERRORS
+
+
+class BinanceTickData(BinanceData):
+    """Live feed of the events of a tick stream, delivered one by one or built into bars of bar_seconds.
+    A tick older than the bar being built, e.g. received late around a reconnect, is dropped"""
+    params = (
+        ('bar_seconds', 0),  # seconds of the bars built from the ticks, 0 delivers every tick
+    )
+
+    _STREAM = None  # stream of the symbol, e.g. 'aggTrade'
+
+    def __init__(self, store, **kwargs):
+        # The feed reports the timeframe it delivers, so it can be resampled or replayed
+        if self.p.bar_seconds:
+            self.p.timeframe, self.p.compression = tf.Seconds, self.p.bar_seconds
+        else:
+            self.p.timeframe, self.p.compression = tf.Ticks, 1
+        BinanceData.__init__(self, store, **kwargs)
+        self.LiveBars = True  # ticks are only streamed, there is no history
+
+        self._bar_ms = int(self.p.bar_seconds * 1000)
+        self._bar = None  # bar being built, [timestamp, ...] as delivered by _fill_lines
+        self._bar_lock = threading.Lock()  # _bar is built by the socket thread and flushed by Cerebro
+
+    def _handle_tick_socket_message(self, msg):
+        if msg.get('e') == 'error':
+            if msg.get('type') not in RECONNECT_ERRORS:
+                raise RuntimeError(f"Socket error for ticker {self.symbol}: {msg}")
+            print(f"Socket reconnecting for ticker: {self.symbol}", msg['m'])
+            return
+
+        tick = self._parser_to_tick(msg)
+        if not self._bar_ms:
+            self._put_kline(tick)
+            return
+
+        start = tick[0] - tick[0] % self._bar_ms
+        with self._bar_lock:
+            if self._bar is not None and start > self._bar[0]:
+                self._put_kline(self._bar)
+                self._bar = None
+            if self._bar is None:
+                if self._last_time is not None and start <= self._last_time:  # Late tick of a bar already delivered
+                    return
+                self._bar = self._new_bar(start, tick)
+            elif start == self._bar[0]:
+                self._add_to_bar(self._bar, tick)
+            # else a late tick of the bar before, its stale price would become the close of the newer bar
+
+    def _flush_bar(self):
+        """Delivers the bar being built once its period is over, even if no tick of the next one arrived"""
+        now = self._store.time_ms()
+        with self._bar_lock:
+            if self._bar is not None and (now >= self._bar[0] + self._bar_ms or self._store.replay_done.is_set()):  # or the journal ended
+                self._put_kline(self._bar)
+                self._bar = None
+
+    def _load_kline(self):
+        if self._bar_ms and not self._data:
+            self._flush_bar()
+        return BinanceData._load_kline(self)
+
+    def start(self):
+        DataBase.start(self)
+
+        self.interval = self._STREAM
+        self.symbol_info = self._store.get_symbol_info(self.symbol)
+        if self.symbol_info is None:
+            self._state = self._ST_OVER
+            self.put_notification(self.NOTSUBSCRIBED)
+            return
+
+        if not self._store.streaming:
+            self._state = self._ST_OVER
+            return
+
+        self._store.subscribe(f"{self.symbol_info['symbol'].lower()}@{self._STREAM}", self._handle_tick_socket_message)
+        self._state = self._ST_HISTORBACK  # _load starts live, once every feed subscribed its stream
+
+
+class BinanceTradeData(BinanceTickData):
+    """Aggregated trades, every tick has open = high = low = close = price and volume = quantity
+    https://binance-docs.github.io/apidocs/spot/en/#aggregate-trade-streams"""
+    _STREAM = 'aggTrade'
+
+    def _parser_to_tick(self, msg):
+        """(trade time, price, quantity)"""
+        return msg['T'], float(msg['p']), float(msg['q'])
+
+    def _new_bar(self, start, tick):
+        _, price, quantity = tick
+        return [start, price, price, price, price, quantity]
+
+    def _add_to_bar(self, bar, tick):
+        _, price, quantity = tick
+        if price > bar[2]:
+            bar[2] = price
+        elif price < bar[3]:
+            bar[3] = price
+        bar[4] = price
+        bar[5] += quantity
+
+    def _fill_lines(self, kline):
+        if len(kline) == 3:  # Tick
+            timestamp, price, quantity = kline
+            kline = (timestamp, price, price, price, price, quantity)
+        BinanceData._fill_lines(self, kline)
+
+
+class BinanceBookTickerData(BinanceTickData):
+    """Best bid and ask, prices are the mid price and the last quotes of the bar are in the bid/ask lines
+    https://binance-docs.github.io/apidocs/spot/en/#individual-symbol-book-ticker-streams"""
+    lines = ('bid', 'bidsize', 'ask', 'asksize',)
+
+    _STREAM = 'bookTicker'
+
+    def _parser_to_tick(self, msg):
+        """(receive time, bid, bid quantity, ask, ask quantity), the spot stream has no event time"""
+        return (msg.get('E') or self._store.time_ms(), float(msg['b']), float(msg['B']),
+                float(msg['a']), float(msg['A']))
+
+    def _new_bar(self, start, tick):
+        mid = (tick[1] + tick[3]) / 2
+        return [start, mid, mid, mid, mid, 0.0, *tick[1:]]
+
+    def _add_to_bar(self, bar, tick):
+        mid = (tick[1] + tick[3]) / 2
+        if mid > bar[2]:
+            bar[2] = mid
+        elif mid < bar[3]:
+            bar[3] = mid
+        bar[4] = mid
+        bar[6:] = tick[1:]
+
+    def _fill_lines(self, kline):
+        if len(kline) == 5:  # Tick
+            mid = (kline[1] + kline[3]) / 2
+            kline = (kline[0], mid, mid, mid, mid, 0.0, *kline[1:])
+        BinanceData._fill_lines(self, kline[:6])
+        self.lines.bid[0], self.lines.bidsize[0], self.lines.ask[0], self.lines.asksize[0] = kline[6:]
@@ -0,0 +1,4 @@
+from .history import bench_history
+from .live import bench_live
+from .orders import bench_orders, bench_reports
+from .runner import measure, report
@@ -0,0 +1,40 @@
+"""python -m benchmarks [names] [--output results.json], see --help"""
+import argparse
+
+from . import bench_history, bench_live, bench_orders, bench_reports, measure, report
+
+BENCHMARKS = {  # name: (benchmark, params from the command line)
+    'history': (bench_history, ('days', 'symbols', 'latency')),
+    'live': (bench_live, ('symbols', 'bars')),
+    'reports': (bench_reports, ('orders', 'open_orders')),
+    'orders': (bench_orders, ('orders', 'latency')),
+    'orders_async': (lambda **kw: bench_orders(async_orders=True, **kw), ('orders', 'latency')),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='backtrader_binance benchmarks')
+    parser.add_argument('names', nargs='*', metavar='name', help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', help='JSON results file, stdout by default')
+    parser.add_argument('--days', type=int, help='history: days of 1 minute klines')
+    parser.add_argument('--symbols', type=int, help='history, live: symbols loaded at once')
+    parser.add_argument('--bars', type=int, help='live: klines per symbol')
+    parser.add_argument('--orders', type=int, help='reports, orders: orders sent')
+    parser.add_argument('--open-orders', type=int, help='reports: resting orders open while the reports are handled')
+    parser.add_argument('--latency', type=float, help='history, orders: seconds the mock exchange adds to every response')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run measuring peak memory')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = []
+    for name in args.names or BENCHMARKS:
+        bench, options = BENCHMARKS[name]
+        params = {option: getattr(args, option) for option in options if getattr(args, option) is not None}
+        results.append(measure(name, bench, memory=not args.no_memory, **params))
+    report(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
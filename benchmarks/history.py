@@ -0,0 +1,37 @@
+import time
+
+from backtrader_binance import BinanceStore
+from backtrader_binance.binance_mock_exchange import BinanceMockExchange
+
+from .runner import Timer
+
+
+class TimedStore(BinanceStore):
+    """BinanceStore keeping the latency of every klines request"""
+
+    def __init__(self, *args, **kwargs):
+        BinanceStore.__init__(self, *args, **kwargs)
+        self.latencies = []
+
+    def get_klines(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return BinanceStore.get_klines(self, *args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def bench_history(days=7, interval='1m', symbols=1, download_workers=4, latency=0.0):
+    """Historical klines loaded by load_klines from the mock exchange, per kline; latencies are per request.
+    The mock serves from the same process, its work is part of the time"""
+    names = [f"COIN{i}USDT" for i in range(symbols)]
+    with BinanceMockExchange(symbols={name: (name[:-4], 'USDT', 100.0) for name in names}, latency=latency) as exchange:
+        store = TimedStore('key', 'secret', 'USDT', base_url=exchange.url, download_workers=download_workers)
+        start_time = int(time.time() * 1000) - days * 86400000
+        store.get_symbol_info(names[0])
+
+        count = 0
+        with Timer() as timer:
+            for symbol in names:
+                count += len(store.load_klines(symbol, interval, start_time))
+        return count, timer.seconds, store.latencies
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import backtrader as bt
+
+from backtrader_binance import BinanceStore
+
+from .runner import Timer
+
+
+def live_feeds(store, symbols, **kwargs):
+    """Live 1 minute BinanceData feeds of symbols, started outside Cerebro and fed by the caller"""
+    cerebro = bt.Cerebro()
+    datas = []
+    for symbol in symbols:
+        data = store.getdata(dataname=symbol, timeframe=bt.TimeFrame.Minutes, compression=1, LiveBars=True, **kwargs)
+        data.setenvironment(cerebro)
+        data._start()
+        data._state = data._ST_LIVE  # The offline store has no stream to start
+        datas.append(data)
+    return datas
+
+
+def kline_message(symbol, open_time, price):
+    """Closed kline as received from <symbol>@kline_1m"""
+    return {'e': 'kline', 'E': open_time + 60000, 's': symbol, 'k': {
+        't': open_time, 'T': open_time + 59999, 's': symbol, 'i': '1m', 'o': f"{price:.2f}", 'c': f"{price + 1:.2f}",
+        'h': f"{price + 2:.2f}", 'l': f"{price - 1:.2f}", 'v': '10.00000000', 'x': True}}
+
+
+def bench_live(symbols=10, bars=1000, queue_size=10000, queue_policy='block'):
+    """Klines of symbols feeds arriving in bursts, one per symbol and minute, from the socket thread
+    to the lines of the feeds loaded Cerebro-like; latencies are from the socket message to the loaded bar"""
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    names = [f"COIN{i}USDT" for i in range(symbols)]
+    datas = live_feeds(store, names, queue_size=queue_size, queue_policy=queue_policy)
+    start = int(time.time() * 1000) // 60000 * 60000 - bars * 60000
+    messages = [[kline_message(name, start + j * 60000, 100.0 + j % 50) for name in names] for j in range(bars)]
+    sent = [[] for _ in datas]  # perf_counter of every message, by feed
+
+    def socket():
+        for burst in messages:
+            for i, msg in enumerate(burst):
+                sent[i].append(time.perf_counter())
+                datas[i]._handle_kline_socket_message(msg)
+
+    latencies = []
+    loaded = [0] * len(datas)
+    with Timer() as timer:
+        thread = threading.Thread(target=socket, daemon=True)
+        thread.start()
+        while sum(loaded) < symbols * bars:
+            # As Cerebro's _runnext: feeds only wait for klines when none of them has any, then one bar per feed
+            qcheck = not any(data.haslivedata() for data in datas)
+            for data in datas:
+                data.do_qcheck(qcheck, 0)
+            for i, data in enumerate(datas):
+                if loaded[i] == bars:  # An empty live feed waits for klines up to qcheck
+                    continue
+                if data.load():
+                    latencies.append(time.perf_counter() - sent[i][loaded[i]])
+                    loaded[i] += 1
+        thread.join()
+    return sum(loaded), timer.seconds, latencies
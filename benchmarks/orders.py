@@ -0,0 +1,94 @@
+import time
+
+import backtrader as bt
+
+from backtrader.order import BuyOrder
+
+from backtrader_binance import BinanceStore
+from backtrader_binance.binance_mock_exchange import BinanceMockExchange
+
+from .live import kline_message, live_feeds
+from .runner import Timer
+
+
+def _first_bar(data):
+    """Loads one kline, orders are priced from the bar on the lines"""
+    data._handle_kline_socket_message(kline_message(data.symbol, int(time.time() * 1000) // 60000 * 60000, 100.0))
+    data.load()
+
+
+def execution_report(order_id, status, execution, quantity, price):
+    """https://binance-docs.github.io/apidocs/spot/en/#payload-order-update"""
+    filled = execution == 'TRADE'
+    return {'e': 'executionReport', 'E': 0, 's': 'COIN0USDT', 'c': f"client{order_id}", 'S': 'BUY', 'o': 'MARKET',
+            'f': 'GTC', 'q': f"{quantity:.8f}", 'p': '0.00000000', 'x': execution, 'X': status, 'i': order_id,
+            'l': f"{quantity:.8f}" if filled else '0.00000000', 'z': f"{quantity:.8f}" if filled else '0.00000000',
+            'L': f"{price:.8f}" if filled else '0.00000000', 'n': '0.00000000' if filled else '0',
+            'N': 'COIN0' if filled else None, 'T': int(time.time() * 1000), 't': order_id if filled else -1}
+
+
+def bench_reports(orders=10000, open_orders=0):
+    """Execution reports handled by BinanceBroker._handle_user_socket_message, NEW then FILLED for each order,
+    the notifications drained as Cerebro does; latencies are per report.
+    open_orders resting orders stay open meanwhile, the latencies should not grow with them"""
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    data, = live_feeds(store, ['COIN0USDT'])
+    _first_bar(data)
+    broker = store.getbroker()
+    for i in range(orders, orders + open_orders):
+        order = BuyOrder(owner=None, data=data, size=0.001, price=90.0, exectype=bt.Order.Limit)
+        order.info['binance_id'] = i
+        order.info['client_order_id'] = f"client{i}"
+        broker._add_open_order(order)
+    for i in range(orders):
+        order = BuyOrder(owner=None, data=data, size=0.001, price=None, exectype=bt.Order.Market)
+        order.info['binance_id'] = i
+        order.info['client_order_id'] = f"client{i}"
+        broker._client_orders[order.info['client_order_id']] = order
+    messages = [msg for i in range(orders) for msg in (execution_report(i, 'NEW', 'NEW', 0.001, 100.0),
+                                                       execution_report(i, 'FILLED', 'TRADE', 0.001, 100.0))]
+
+    latencies = []
+    with Timer() as timer:
+        for n, msg in enumerate(messages):
+            start = time.perf_counter()
+            broker._handle_user_socket_message(msg)
+            latencies.append(time.perf_counter() - start)
+            if n % 1000 == 999:
+                while broker.get_notification() is not None:
+                    pass
+    return len(messages), timer.seconds, latencies
+
+
+def bench_orders(orders=200, async_orders=False, latency=0.0):
+    """Market buy and sell cycles against the mock exchange through BinanceBroker,
+    latencies are from submit to the order completed by the broker"""
+    with BinanceMockExchange(symbols={'COIN0USDT': ('COIN0', 'USDT', 100.0)},
+                             balances={'USDT': 1e9}, latency=latency) as exchange:
+        store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+        data, = live_feeds(store, ['COIN0USDT'])
+        _first_bar(data)
+        broker = store.getbroker(async_orders=async_orders)
+        broker.start()
+        deadline = time.monotonic() + 10
+        while not exchange._user_sockets and time.monotonic() < deadline:  # Fills of async orders come from the user data stream
+            time.sleep(0.01)
+
+        latencies = []
+        try:
+            with Timer() as timer:
+                for i in range(orders):
+                    start = time.perf_counter()
+                    submit = broker.buy if i % 2 == 0 else broker.sell
+                    order = submit(None, data, 0.001)  # Updated in place by the broker, sync orders are done already
+                    while order.status not in (order.Completed, order.Canceled, order.Rejected, order.Expired):
+                        time.sleep(0.0001)
+                    if order.status != order.Completed:
+                        raise RuntimeError(f"Order {order.getstatusname()}")
+                    latencies.append(time.perf_counter() - start)
+                    while broker.get_notification() is not None:
+                        pass
+        finally:
+            broker.stop()
+            store.stop_socket()
+        return orders, timer.seconds, latencies
@@ -0,0 +1,85 @@
+import datetime as dt
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+from importlib.metadata import PackageNotFoundError, version
+
+
+def percentile(values, q):
+    """q-th percentile (0..100) of values, nearest rank"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def measure(name, bench, memory=True, **params):
+    """Runs bench(**params) -> (count, seconds, latencies in seconds) for its timings,
+    then once more under tracemalloc for its peak memory, which would slow the timed run"""
+    gc.collect()
+    count, seconds, latencies = bench(**params)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            bench(**params)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        'name': name,
+        'params': params,
+        'count': count,
+        'seconds': round(seconds, 6),
+        'throughput': round(count / seconds, 2) if seconds else None,  # per second
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(max(latencies) if latencies else None),
+        'peak_memory_mb': round(peak / 2 ** 20, 3) if peak is not None else None,
+    }
+    print(f"{name}: {count} in {result['seconds']} s, {result['throughput']}/s, "
+          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, peak {result['peak_memory_mb']} MB")
+    return result
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 4) if seconds is not None else None
+
+
+def report(results, path=None):
+    """Results with the environment they ran in, as JSON to path (stdout if None) to compare releases"""
+    try:
+        package_version = version('backtrader_binance')
+    except PackageNotFoundError:
+        package_version = None
+    doc = {
+        'package': 'backtrader_binance',
+        'version': package_version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    }
+    text = json.dumps(doc, indent=2)
+    if path is None:
+        print(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    return doc
+
+
+class Timer(object):
+    """perf_counter stopwatch of a benchmark loop"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
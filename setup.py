@@ -22,8 +22,8 @@ setup(name='backtrader_binance',
       long_description=long_description,
       long_description_content_type='text/markdown',
       url='https://github.com/WISEPLAT/backtrader_binance',
-      packages=find_packages(exclude=['docs', 'examples', 'ConfigBinance']),
-      install_requires=['python-binance', 'backtrader', 'pandas', 'matplotlib'],
+      packages=find_packages(exclude=['docs', 'examples', 'ConfigBinance', 'benchmarks', 'benchmarks.*']),
+      install_requires=['python-binance==1.0.37', 'backtrader', 'pandas', 'numpy', 'matplotlib'],
       classifiers=[
           # How mature is this project? Common values are
           #   3 - Alpha
@@ -0,0 +1,9 @@
+import pytest
+
+from backtrader_binance.binance_mock_exchange import BinanceMockExchange
+
+
+@pytest.fixture
+def exchange():
+    with BinanceMockExchange() as exchange:
+        yield exchange
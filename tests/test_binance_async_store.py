@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import pytest
+
+from backtrader_binance import BinanceAsyncStore
+from backtrader_binance.binance_async_store import BinanceAsyncSocketManager
+
+
+class FakeSocket(object):
+    """Socket of BinanceSocketManager, dropped on its first recv if drop is set"""
+
+    def __init__(self, messages, drop=False):
+        self.messages = messages
+        self.drop = drop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def recv(self):
+        if self.drop:
+            raise OSError("Connection reset")
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.Event().wait()  # Open and idle
+
+
+@pytest.fixture
+def store():
+    store = BinanceAsyncStore('key', 'secret', 'USDT', offline=True)
+    yield store
+    store.stop_socket()
+
+
+def test_socket_reopened_when_callback_raises_on_reconnect(store):
+    sockets = [FakeSocket([], drop=True), FakeSocket([{'e': 'executionReport'}])]
+    received = []
+    done = threading.Event()
+
+    def callback(msg):
+        received.append(msg)
+        if msg['e'] == 'error':
+            raise TypeError("exceptions must derive from BaseException")
+        done.set()
+
+    manager = BinanceAsyncSocketManager(store, None)
+    manager._start(lambda: sockets.pop(0), callback)
+    try:
+        assert done.wait(5)
+    finally:
+        manager.stop()
+    assert [msg['e'] for msg in received] == ['error', 'executionReport']
+
+
+def test_broker_reconnect_error_is_not_fatal(store):
+    broker = store.getbroker()
+    broker._handle_user_socket_message({'e': 'error', 'type': 'BinanceWebsocketClosed', 'm': 'Socket reopened'})
+    with pytest.raises(RuntimeError):
+        broker._handle_user_socket_message({'e': 'error', 'type': 'Unexpected', 'm': 'boom'})
@@ -0,0 +1,189 @@
+import threading
+import time
+
+import backtrader as bt
+import pytest
+
+from backtrader.order import BuyOrder
+
+from backtrader_binance import BinanceStore
+
+
+class Unscannable(dict):
+    """Index a report must be looked up in, never scanned"""
+
+    def __iter__(self):
+        raise AssertionError("open orders scanned")
+
+    values = items = keys = __iter__
+
+
+def execution_report(order_id, status, execution):
+    filled = execution == 'TRADE'
+    return {'e': 'executionReport', 's': 'BTCUSDT', 'c': f"client{order_id}", 'S': 'BUY', 'o': 'LIMIT', 'x': execution,
+            'X': status, 'i': order_id, 'l': '0.00100000' if filled else '0.00000000', 'L': '100.00000000' if filled else '0.00000000',
+            'n': '0.00000000', 'N': 'BTC', 'T': 0}
+
+
+def make_broker():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    data = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    data.forward()
+    data._fill_lines((0, 100.0, 100.0, 100.0, 100.0, 1.0))  # Orders are dated and priced from the bar on the lines
+    broker = store.getbroker()
+    return broker, data
+
+
+def add_order(broker, data, order_id, client_only=False):
+    order = BuyOrder(owner=None, data=data, size=0.001, price=100.0, exectype=bt.Order.Limit)
+    order.info['client_order_id'] = f"client{order_id}"
+    if client_only:  # Async order, reported before its REST response
+        broker._client_orders[order.info['client_order_id']] = order
+    else:
+        order.info['binance_id'] = order_id
+        broker._add_open_order(order)
+    return order
+
+
+def test_reports_are_routed_by_index():
+    broker, data = make_broker()
+    orders = [add_order(broker, data, i) for i in range(1000)]
+    pending = add_order(broker, data, 1000, client_only=True)
+    broker.open_orders = Unscannable(broker.open_orders)
+    broker._client_orders = Unscannable(broker._client_orders)
+
+    broker._handle_user_socket_message(execution_report(500, 'FILLED', 'TRADE'))
+    broker._handle_user_socket_message(execution_report(1000, 'NEW', 'NEW'))
+    broker._handle_user_socket_message(execution_report(7, 'CANCELED', 'CANCELED'))
+    broker._handle_user_socket_message(execution_report(5000, 'NEW', 'NEW'))  # Not ours
+
+    assert orders[500].status == bt.Order.Completed
+    assert orders[7].status == bt.Order.Canceled
+    assert pending.status == bt.Order.Accepted and pending.info['binance_id'] == 1000
+    assert broker.open_orders.get(1000) is pending
+    assert 500 not in broker.open_orders and 'client500' not in broker._client_orders
+    assert 7 not in broker.open_orders and 'client7' not in broker._client_orders
+    assert len(broker.open_orders) == 999
+
+
+def test_getbroker_params_apply():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    broker = store.getbroker(notifs_size=5)
+    broker.start()
+    assert broker.notifs.maxsize == 5
+    for _ in range(5):
+        broker.notifs.put(None)
+    assert broker.notifs.full()
+    broker.stop()
+
+
+def test_notifications_wake_the_feeds():
+    broker, data = make_broker()
+    data.do_qcheck(True, 0)  # Waits up to qcheck=0.5 s for a kline
+    order = add_order(broker, data, 1)
+    threading.Timer(0.05, broker.notify, (order,)).start()
+    start = time.monotonic()
+    data._wait_kline()
+    assert time.monotonic() - start < 0.3
+    assert broker.get_notification() is not None
+
+
+def start_async_broker(exchange, **kwargs):
+    """async_orders broker on BTCUSDT of the mock exchange, once its user data stream is subscribed"""
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, retries=1)
+    store.start_streams = lambda: None  # The bar is put on the lines by the test
+    data = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, LiveBars=True)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    data.forward()
+    data._fill_lines((0, 100.0, 100.0, 100.0, 100.0, 1.0))
+    broker = store.getbroker(async_orders=True, **kwargs)
+    broker.start()
+    deadline = time.monotonic() + 10
+    while not exchange._user_sockets and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert exchange._user_sockets
+    return store, broker, data
+
+
+def wait_done(orders):
+    deadline = time.monotonic() + 10
+    while any(order.alive() for order in orders) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not any(order.alive() for order in orders)
+
+
+def notified(broker):
+    statuses = {}
+    while (order := broker.get_notification()) is not None:
+        statuses.setdefault(order.ref, []).append(order.status)
+    return statuses
+
+
+def test_async_reports_before_the_rest_response(exchange):
+    exchange.latency = (0.0, 0.02)  # Workers race, every report of an order is sent before its REST response
+    store, broker, data = start_async_broker(exchange)
+    responses = []
+    create_order = store.create_order
+
+    def create_order_seen(*args, **kwargs):
+        binance_order = create_order(*args, **kwargs)
+        responses.append(broker._client_orders.get(kwargs['newClientOrderId']))  # None, completed by the stream first
+        return binance_order
+    store.create_order = create_order_seen
+
+    try:
+        orders = [broker.buy(None, data, 0.001) for _ in range(20)]
+        assert all(order.status == bt.Order.Submitted for order in orders)
+        wait_done(orders)
+        deadline = time.monotonic() + 10
+        while len(responses) < len(orders) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        broker.stop()
+        store.stop_socket()
+
+    assert responses == [None] * len(orders)
+    statuses = notified(broker)
+    for order in orders:
+        assert statuses[order.ref] == [bt.Order.Submitted, bt.Order.Accepted, bt.Order.Completed]
+        assert exchange.orders[order.info['binance_id']]['clientOrderId'] == order.info['client_order_id']
+    assert not broker.open_orders and not broker._client_orders
+    assert broker.getposition(data).size == pytest.approx(20 * 0.001)
+
+
+def test_async_order_error_is_rejected(exchange):
+    store, broker, data = start_async_broker(exchange)
+    del exchange.symbols['BTCUSDT']  # -1121 Invalid symbol
+    try:
+        order = broker.buy(None, data, 0.001)
+        wait_done([order])
+    finally:
+        broker.stop()
+        store.stop_socket()
+
+    assert order.status == bt.Order.Rejected and 'binance_id' not in order.info
+    assert notified(broker)[order.ref] == [bt.Order.Submitted, bt.Order.Rejected]
+    assert not broker._client_orders
+
+
+def test_stop_waits_for_the_orders_sent(exchange):
+    store, broker, data = start_async_broker(exchange)
+    exchange.latency = 0.2
+    try:
+        orders = [broker.buy(None, data, 0.001) for _ in range(3)]
+        pool = broker._order_pool
+        broker.stop()
+        assert broker._order_pool is None and pool._shutdown
+        assert all('binance_id' in order.info for order in orders)  # REST responses arrived before stop returned
+
+        exchange.latency = 0.0
+        order = broker.buy(None, data, 0.001)  # A restarted broker gets a new pool
+        assert broker._order_pool is not pool
+        wait_done(orders + [order])
+    finally:
+        broker.stop()
+        store.stop_socket()
+    assert broker._order_pool is None
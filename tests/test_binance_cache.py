@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from backtrader_binance import BinanceStore
+
+
+def minute(t):
+    return t - t % 60000
+
+
+def test_cache_merges_head_and_tail_without_duplicates(exchange, tmp_path):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path))
+    now = minute(int(time.time() * 1000))
+    store.load_klines('BTCUSDT', '1m', now - 30 * 60000)
+    cached = store._read_cache(store._cache_path('BTCUSDT', '1m'))
+    assert cached['timestamp'][0] == now - 30 * 60000
+
+    klines = store.load_klines('BTCUSDT', '1m', now - 90 * 60000)  # Head prepended, tail appended
+    cached = store._read_cache(store._cache_path('BTCUSDT', '1m'))
+    times = cached['timestamp']
+    assert times[0] == now - 90 * 60000
+    assert (np.diff(times) == 60000).all()  # Ordered, no gap and no duplicate where the downloads meet
+    assert klines['timestamp'][-1] >= times[-1]  # and the klines still open, only in memory
+
+    expected = [[float(v) for v in exchange.kline('BTCUSDT', '1m', int(t))[:6]] for t in times]
+    np.testing.assert_allclose(cached.tolist(), expected)
+
+
+def test_offline_store_reads_the_cache(exchange, tmp_path):
+    online = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path))
+    start = minute(int(time.time() * 1000)) - 20 * 60000
+    online.load_klines('BTCUSDT', '1m', start)
+    requests = exchange.requests
+
+    offline = BinanceStore('key', 'secret', 'USDT', offline=True, cache_dir=str(tmp_path))
+    history, opened = offline.map_klines('BTCUSDT', '1m', start + 5 * 60000)
+    assert isinstance(history, np.memmap)
+    assert history['timestamp'][0] == start + 5 * 60000
+    assert len(opened) == 0
+    assert exchange.requests == requests
+
+
+def test_partial_trailing_record_is_dropped(exchange, tmp_path):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path))
+    start = minute(int(time.time() * 1000)) - 30 * 60000
+    store.load_klines('BTCUSDT', '1m', start)
+    path = store._cache_path('BTCUSDT', '1m')
+    with open(path, 'r+b') as f:  # A crash 20 bytes into writing the last record
+        f.truncate(os.path.getsize(path) - store._KLINE_DTYPE.itemsize + 20)
+
+    klines = store.load_klines('BTCUSDT', '1m', start)
+    assert os.path.getsize(path) % store._KLINE_DTYPE.itemsize == 0
+    times = store._read_cache(path)['timestamp']
+    assert times[0] == start and (np.diff(times) == 60000).all()
+    assert (np.diff(klines['timestamp']) == 60000).all()
+
+
+def test_stores_sharing_the_cache_dir(exchange, tmp_path):
+    stores = [BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path)) for _ in range(4)]
+    start = minute(int(time.time() * 1000)) - 3000 * 60000
+    threads = [threading.Thread(target=store.load_klines, args=('BTCUSDT', '1m', start)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    times = stores[0]._read_cache(stores[0]._cache_path('BTCUSDT', '1m'))['timestamp']
+    assert times[0] == start and (np.diff(times) == 60000).all()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_head_before_the_listing_is_probed_once(exchange, tmp_path):
+    now = minute(int(time.time() * 1000))
+    exchange.listed['BTCUSDT'] = now - 100 * 60000
+    start = now - 200000 * 60000  # 4 download blocks before the listing
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path))
+    requests = exchange.requests
+    store.load_klines('BTCUSDT', '1m', start)
+    assert exchange.requests - requests == 2  # Listing probe and the klines since
+    times = store._read_cache(store._cache_path('BTCUSDT', '1m'))['timestamp']
+    assert times[0] == now - 100 * 60000
+
+    for _ in range(3):
+        requests = exchange.requests
+        klines = store.load_klines('BTCUSDT', '1m', start)
+        assert exchange.requests - requests == 1  # The tail only
+        assert klines['timestamp'][0] == now - 100 * 60000
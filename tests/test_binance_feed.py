@@ -0,0 +1,145 @@
+import datetime as dt
+import time
+
+import backtrader as bt
+
+from backtrader_binance import BinanceStore
+
+
+def start_feed(store, **kwargs):
+    """1 minute BTCUSDT feed started outside Cerebro, its socket is fed by the test"""
+    store.start_streams = lambda: None
+    data = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, LiveBars=True, **kwargs)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    return data
+
+
+def kline_message(exchange, open_time, closed=True):
+    msg = exchange._kline_message('btcusdt@kline_1m', 'BTCUSDT', '1m', open_time, None if closed else open_time + 30000)
+    return msg['data']
+
+
+def queued(data):
+    klines = []
+    while (kline := data._data.get()) is not None:
+        klines.append(kline)
+    return klines
+
+
+def wait_backfill(data):
+    deadline = time.monotonic() + 10
+    while data._backfilling and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not data._backfilling
+
+
+def test_backfill_queues_missed_klines_before_the_socket_ones(exchange):
+    exchange.latency = 0.2  # The socket klines arrive while the backfill is downloading
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    data = start_feed(store, partial=True)
+    minute = int(time.time() * 1000) // 60000 * 60000
+    data._last_time = minute - 6 * 60000  # Klines of the 5 minutes after it were missed
+
+    data._handle_kline_socket_message(kline_message(exchange, minute - 60000))
+    assert data._backfilling
+    data._handle_kline_socket_message(kline_message(exchange, minute - 60000))  # Sent again
+    data._handle_kline_socket_message(kline_message(exchange, minute, closed=False))
+    wait_backfill(data)
+
+    times = [kline[0] for kline in queued(data)]
+    assert times == [minute - n * 60000 for n in range(5, -1, -1)]
+    assert data._last_time == minute - 60000
+
+
+def test_backfill_error_releases_the_socket_klines(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, retries=1)
+    data = start_feed(store)
+    minute = int(time.time() * 1000) // 60000 * 60000
+    data._last_time = minute - 6 * 60000
+    exchange.stop()  # The download fails
+
+    data._handle_kline_socket_message(kline_message(exchange, minute - 60000))
+    wait_backfill(data)
+    assert [kline[0] for kline in queued(data)] == [minute - 60000]
+
+
+def test_open_history_kline_is_replaced_by_its_closed_version(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    start = dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=5)
+    data = start_feed(store, drop_newest=False, start_date=start)
+    open_time = int(data._history['timestamp'][-1])
+    assert data._last_time == open_time - 60000  # The newest kline of the history is still open
+
+    for _ in range(len(data._history)):
+        assert data.load()
+    bars = len(data)
+    data._handle_kline_socket_message(kline_message(exchange, open_time))
+    assert data.load()
+    assert len(data) == bars  # Updated in place
+    assert data.close[0] == float(exchange.kline('BTCUSDT', '1m', open_time)[4])
+
+
+def test_queue_policy_blocks_only_when_replaying(tmp_path):
+    live = BinanceStore('key', 'secret', 'USDT', offline=True)
+    replay = BinanceStore('key', 'secret', 'USDT', replay=str(tmp_path / 'session.journal'))
+    for store, policy in ((live, 'drop_oldest'), (replay, 'block')):
+        data = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1)
+        assert data._data.policy == policy
+    data = live.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=5, queue_policy='coalesce')
+    assert data._data.policy == 'coalesce'
+
+
+def test_partial_klines_update_the_bar_in_place(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    data = start_feed(store, partial=True)
+    data._state = data._ST_LIVE  # The offline store has no stream to start
+    minute = int(time.time() * 1000) // 60000 * 60000 - 60000
+
+    def update(open_time, seconds):
+        msg = exchange._kline_message('btcusdt@kline_1m', 'BTCUSDT', '1m', open_time, open_time + seconds * 1000)
+        data._handle_kline_socket_message(msg['data'])
+        return float(msg['data']['k']['c'])
+
+    update(minute, 10)
+    close = update(minute, 30)  # Replaces the update still queued
+    assert data.load() and len(data) == 1 and data.close[0] == close
+    assert data._data.get() is None
+    close = update(minute, 45)
+    assert data.load() and len(data) == 1 and data.close[0] == close
+    data._handle_kline_socket_message(kline_message(exchange, minute))
+    assert data.load() and len(data) == 1
+    assert data.close[0] == float(exchange.kline('BTCUSDT', '1m', minute)[4])
+    update(minute + 60000, 5)  # Next bar
+    assert data.load() and len(data) == 2
+    assert bt.num2date(data.datetime[-1]) == dt.datetime(1970, 1, 1) + dt.timedelta(milliseconds=minute)
+
+
+def test_partial_throttle(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    data = start_feed(store, partial=True, partial_throttle=60)
+    minute = int(time.time() * 1000) // 60000 * 60000
+    for seconds in (10, 20, 30):
+        data._handle_kline_socket_message(
+            exchange._kline_message('btcusdt@kline_1m', 'BTCUSDT', '1m', minute, minute + seconds * 1000)['data'])
+    assert data.queue_stats()['depth'] == 1
+    data._handle_kline_socket_message(kline_message(exchange, minute))  # Closed klines are never throttled
+    assert [kline[0] for kline in queued(data)] == [minute]
+
+
+def test_drop_newest_keeps_closed_cached_klines(exchange, tmp_path):
+    online = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url, cache_dir=str(tmp_path))
+    start_date = dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=30)
+    data = online.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, start_date=start_date, LiveBars=False)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    times = data._history['timestamp']
+    assert len(times) and times[-1] + 60000 <= int(time.time() * 1000)  # The kline still open is dropped
+    cached = online._read_cache(online._cache_path('BTCUSDT', '1m'))['timestamp']
+
+    offline = BinanceStore('key', 'secret', 'USDT', offline=True, cache_dir=str(tmp_path))
+    data = offline.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, start_date=start_date, LiveBars=False)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    assert data._history['timestamp'][-1] == cached[-1]  # All cached klines are closed, none is dropped
+    assert data._last_time == cached[-1]
@@ -0,0 +1,115 @@
+import gzip
+import shutil
+import threading
+
+import backtrader as bt
+
+from backtrader_binance import BinanceStore
+from backtrader_binance.binance_journal import BinanceJournal, BinanceReplaySocketManager
+
+
+def kline(n):
+    return {'stream': 'btcusdt@kline_1m', 'data': {'e': 'kline', 'n': n}}
+
+
+def records(path):
+    return [(channel, msg) for _, channel, msg in BinanceJournal.read(path)]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    journal = BinanceJournal(path)
+    journal.write(BinanceJournal.MARKET, kline(0))
+    journal.write(BinanceJournal.USER, {'e': 'executionReport'})
+    journal.close()
+    assert records(path) == [(BinanceJournal.MARKET, kline(0)), (BinanceJournal.USER, {'e': 'executionReport'})]
+
+
+def test_session_after_a_crash_is_read(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    journal = BinanceJournal(path, flush_interval=0)  # Every record is flushed
+    journal.write(BinanceJournal.MARKET, kline(0))
+    journal.write(BinanceJournal.MARKET, kline(1))
+    shutil.copy(path, path + '.crashed')  # The file as the process left it when it died
+    journal.close()
+    shutil.move(path + '.crashed', path)
+
+    journal = BinanceJournal(path)
+    journal.write(BinanceJournal.MARKET, kline(2))
+    journal.close()
+    assert journal.path == path + '.1'
+    assert records(path) == [(BinanceJournal.MARKET, kline(n)) for n in range(3)]
+
+
+def test_cut_member_followed_by_another_one(tmp_path):
+    """Journals appending every session to the same file"""
+    path = str(tmp_path / 'session.journal')
+    journal = BinanceJournal(path, flush_interval=0)
+    journal.write(BinanceJournal.MARKET, kline(0))
+    with open(path, 'rb') as f:
+        cut = f.read()
+    journal.close()
+    with open(path, 'wb') as f:
+        f.write(cut)
+    with gzip.open(path, 'ab') as f:
+        f.write(b'garbage')
+
+    assert records(path) == [(BinanceJournal.MARKET, kline(0))]
+
+
+class ReplayStore(object):
+    replay_time = None
+
+    def __init__(self):
+        self.replay_done = threading.Event()
+        self.new_kline = threading.Condition()
+
+
+def test_replay_ends_even_if_a_callback_fails(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    journal = BinanceJournal(path)
+    journal.write(BinanceJournal.MARKET, kline(0))
+    journal.close()
+
+    def callback(msg):
+        raise ValueError(msg)
+
+    store = ReplayStore()
+    replay = BinanceReplaySocketManager(store, path)
+    replay.start_multiplex_socket(callback, ['btcusdt@kline_1m'])
+    replay.join(5)
+    assert store.replay_done.is_set()
+
+
+def closed_kline(open_time, price):
+    return {'stream': 'btcusdt@kline_1m', 'data': {'e': 'kline', 'E': open_time + 60000, 's': 'BTCUSDT', 'k': {
+        't': open_time, 'T': open_time + 59999, 's': 'BTCUSDT', 'i': '1m', 'o': str(price), 'c': str(price + 1),
+        'h': str(price + 2), 'l': str(price - 1), 'v': '10.0', 'x': True}}}
+
+
+class BuyEveryBar(bt.Strategy):
+    def __init__(self):
+        self.statuses = []
+
+    def next(self):
+        self.buy(size=0.001)
+
+    def notify_order(self, order):
+        self.statuses.append(order.getstatusname())
+
+
+def test_replayed_strategy_orders_are_rejected(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    journal = BinanceJournal(path)
+    for n in range(3):
+        journal.write(BinanceJournal.MARKET, closed_kline(1700000000000 + n * 60000, 100.0 + n))
+    journal.close()
+
+    store = BinanceStore('key', 'secret', 'USDT', replay=path)
+    cerebro = bt.Cerebro()
+    cerebro.adddata(store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, LiveBars=True))
+    cerebro.setbroker(store.getbroker())
+    cerebro.addstrategy(BuyEveryBar)
+    strategy, = cerebro.run()
+    store.stop_socket()
+    assert strategy.statuses and set(strategy.statuses) == {'Rejected'}  # The last one is notified after the last bar
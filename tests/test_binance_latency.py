@@ -0,0 +1,86 @@
+import time
+
+from types import SimpleNamespace
+
+import backtrader as bt
+import pytest
+
+from backtrader.order import BuyOrder
+
+from backtrader_binance import BinanceStore
+from backtrader_binance.binance_latency import BinanceLatencyHistogram, BinanceLatencyTracer
+
+
+def test_buckets():
+    histogram = BinanceLatencyHistogram()
+    for seconds in (0.5e-6, 1e-6, 2e-6, 1e-3):
+        histogram.record(seconds)
+    assert histogram.counts == {0: 1, 1: 1, 5: 1, 40: 1}  # 4 per doubling from 1 µs
+    assert histogram._upper(40) >= 1e-3 > histogram._upper(39)
+
+
+def test_percentiles():
+    histogram = BinanceLatencyHistogram()
+    assert histogram.percentile(50) is None
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    assert 0.050 <= histogram.percentile(50) <= 0.050 * 1.19
+    assert 0.090 <= histogram.percentile(90) <= 0.090 * 1.19
+    assert histogram.percentile(99) <= histogram.max == histogram.percentile(100) == 0.1
+    stats = histogram.stats()
+    assert stats['count'] == 100 and stats['min_ms'] == 1.0 and stats['mean_ms'] == pytest.approx(50.5)
+
+
+def kline_message(open_time, event_time):
+    return {'e': 'kline', 'E': event_time, 's': 'BTCUSDT', 'k': {
+        't': open_time, 'T': open_time + 59999, 's': 'BTCUSDT', 'i': '1m', 'o': '100.0', 'c': '101.0',
+        'h': '102.0', 'l': '99.0', 'v': '10.0', 'x': True}}
+
+
+def execution_report(status, execution):
+    filled = execution == 'TRADE'
+    return {'e': 'executionReport', 's': 'BTCUSDT', 'c': 'client1', 'x': execution, 'X': status, 'i': 1,
+            'l': '0.001' if filled else '0', 'L': '101.0' if filled else '0', 'n': '0', 'T': 0}
+
+
+def test_stages_are_recorded_from_the_feed_and_the_broker():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True, trace_latency=True)
+    tracer = store.tracer
+    data = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1, LiveBars=True)
+    data.setenvironment(bt.Cerebro())
+    data._start()
+    data._state = data._ST_LIVE  # The offline store has no stream to start
+    open_time = store.time_ms() // 60000 * 60000 - 60000
+    data._handle_kline_socket_message(kline_message(open_time, store.time_ms() - 20))  # Sent 20 ms ago
+    time.sleep(0.01)
+    assert data.load()
+    assert tracer.bar(data)[0] == open_time
+    broker = store.getbroker()
+
+    order = BuyOrder(owner=None, data=data, size=0.001, price=None, exectype=bt.Order.Market)
+    order.info['client_order_id'] = 'client1'
+    tracer.submitted(order)
+    broker._client_orders['client1'] = order
+    broker._handle_user_socket_message(execution_report('NEW', 'NEW'))
+    broker._handle_user_socket_message(execution_report('FILLED', 'TRADE'))
+
+    stats = tracer.stats()
+    assert stats['exchange']['count'] == 1 and stats['exchange']['min_ms'] >= 20
+    assert stats['queue']['count'] == 1 and stats['queue']['min_ms'] >= 10
+    for stage in ('decision', 'ack', 'fill', 'tick_to_trade'):
+        assert stats[stage]['count'] == 1
+    trace = tracer.order(order)
+    assert trace['bar'] == open_time and trace['binance_id'] == 1
+    assert trace['received'] <= trace['loaded'] <= trace['submitted'] <= trace['acked'] <= trace['filled']
+    broker._handle_user_socket_message(execution_report('FILLED', 'TRADE'))  # Reported twice
+    assert tracer.stats()['fill']['count'] == 1
+
+
+def test_orders_kept():
+    tracer = BinanceLatencyTracer(orders_kept=2)
+    data = SimpleNamespace(symbol='BTCUSDT')
+    orders = [SimpleNamespace(ref=ref, data=data, info={}) for ref in range(3)]
+    for order in orders:
+        tracer.submitted(order)
+    assert tracer.order(orders[0]) is None and tracer.order(orders[2]) is not None
+    assert tracer.stats()['decision']['count'] == 0  # No live bar on the lines
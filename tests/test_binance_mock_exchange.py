@@ -0,0 +1,25 @@
+import asyncio
+
+import aiohttp
+
+
+async def subscribe(session, url):
+    ws = await session.ws_connect(f"{url}/ws-api/v3")
+    await ws.send_json({'id': 1, 'method': 'userDataStream.subscribe.signature', 'params': {}})
+    return ws, (await ws.receive_json())['result']['subscriptionId']
+
+
+def test_subscription_ids_are_never_reused(exchange):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            first, first_id = await subscribe(session, exchange.url)
+            second, second_id = await subscribe(session, exchange.url)
+            await first.close()
+            await asyncio.sleep(0.1)  # The exchange forgets the first subscription
+            third, third_id = await subscribe(session, exchange.url)
+            await second.close()
+            await third.close()
+            return first_id, second_id, third_id
+
+    first_id, second_id, third_id = asyncio.run(run())
+    assert len({first_id, second_id, third_id}) == 3
@@ -0,0 +1,77 @@
+import pytest
+
+from backtrader_binance.binance_orderbook import BinanceOrderBook
+
+
+def depth_update(first, last, bids=(), asks=()):
+    return {'e': 'depthUpdate', 's': 'BTCUSDT', 'U': first, 'u': last, 'b': list(bids), 'a': list(asks)}
+
+
+def snapshot(last_update_id):
+    return {'lastUpdateId': last_update_id,
+            'bids': [['100.0', '1.0'], ['99.0', '2.0'], ['98.0', '3.0']],
+            'asks': [['101.0', '1.0'], ['102.0', '2.0']]}
+
+
+def synced_book(last_update_id=10):
+    book = BinanceOrderBook('BTCUSDT')
+    assert book.update(depth_update(last_update_id, last_update_id))  # In the snapshot
+    assert book.load_snapshot(snapshot(last_update_id))
+    return book
+
+
+def test_snapshot_replays_the_buffered_events():
+    book = BinanceOrderBook('BTCUSDT')
+    assert book.update(depth_update(5, 8, bids=[['100.0', '9.0']]))  # The first event requests the snapshot
+    assert not book.update(depth_update(9, 12, asks=[['101.0', '0']]))  # Requested already
+    assert not book.synced
+    assert book.load_snapshot(snapshot(10))
+    assert book.synced and book.last_update_id == 12
+    assert book.best_bid() == (100.0, 1.0)  # Event 5-8 is older than the snapshot
+    assert book.best_ask() == (102.0, 2.0)  # 101 removed by 9-12
+
+
+def test_snapshot_older_than_the_events_is_rejected():
+    book = BinanceOrderBook('BTCUSDT')
+    book.update(depth_update(20, 25))
+    assert not book.load_snapshot(snapshot(10))
+    assert not book.synced
+    assert book.load_snapshot(snapshot(22))
+    assert book.last_update_id == 25
+
+
+def test_gap_resets_the_book_and_requests_a_snapshot():
+    book = synced_book()
+    assert not book.update(depth_update(11, 11, bids=[['97.0', '1.0']]))
+    assert not book.update(depth_update(5, 11))  # Already applied
+    assert book.update(depth_update(13, 14))  # 12 was missed
+    assert not book.synced
+    assert book.best_bid() is None
+    assert not book.update(depth_update(15, 15))  # Buffered for the snapshot already requested
+    assert book.load_snapshot(snapshot(13))
+    assert book.last_update_id == 15
+
+
+def test_gap_between_snapshot_and_buffer_resets():
+    book = BinanceOrderBook('BTCUSDT')
+    book.update(depth_update(11, 12))
+    book.update(depth_update(14, 15))  # 13 was missed while buffering
+    assert not book.load_snapshot(snapshot(11))
+    assert not book.synced
+
+
+def test_sides():
+    book = synced_book()
+    assert book.top(2) == ([(100.0, 1.0), (99.0, 2.0)], [(101.0, 1.0), (102.0, 2.0)])
+    assert book.mid_price() == 100.5
+    assert book.quantity(99.0) == 2.0 and book.quantity(102.0) == 2.0 and book.quantity(50.0) == 0.0
+    assert book.depth('BUY', 101.5) == 1.0
+    assert book.depth('SELL', 99.0) == 3.0
+    price, filled = book.vwap('SELL', 2.0)
+    assert filled == 2.0 and price == pytest.approx(99.5)
+    price, filled = book.vwap('BUY', 10.0)  # Deeper than the book
+    assert filled == 3.0 and price == pytest.approx(305.0 / 3)
+
+    book.update(depth_update(11, 11, bids=[['100.0', '0'], ['99.5', '4.0']], asks=[['100.5', '1.0']]))
+    assert book.best_bid() == (99.5, 4.0)
+    assert book.best_ask() == (100.5, 1.0)
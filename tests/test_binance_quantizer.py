@@ -0,0 +1,48 @@
+from decimal import ROUND_CEILING, ROUND_HALF_UP
+
+import numpy as np
+
+from backtrader_binance.binance_quantizer import BinanceQuantizer
+
+
+def test_format_snaps_to_grid():
+    quantizer = BinanceQuantizer('0.01000000', '0.01', '1000.00')
+    assert quantizer.precision == 2
+    assert quantizer.format(1.239) == '1.23'
+    assert quantizer.format(1.231, ROUND_CEILING) == '1.24'
+    assert quantizer.format(-1.239) == '-1.24'
+    assert BinanceQuantizer('0.01', rounding=ROUND_HALF_UP).format(1.235) == '1.24'
+
+
+def test_format_float_noise():
+    # 0.29 * 100 is 28.999999999999996 as a float, still 29 ticks
+    assert BinanceQuantizer('0.01').format(0.29) == '0.29'
+    assert BinanceQuantizer('0.00001').format(0.3) == '0.30000'
+
+
+def test_format_whole_step():
+    quantizer = BinanceQuantizer('10.00000000')
+    assert quantizer.precision == 0
+    assert quantizer.format(1234.5) == '1230'
+
+
+def test_quantize_limits():
+    quantizer = BinanceQuantizer('0.01', '0.10', '100')
+    snapped, valid = quantizer.quantize([0.29, 0.056, 150.0, 1.239])
+    np.testing.assert_allclose(snapped, [0.29, 0.05, 150.0, 1.23])
+    assert valid.tolist() == [True, False, False, True]
+
+
+def test_quantize_no_max():
+    _, valid = BinanceQuantizer('0.01', '0', '0').quantize([1e12])
+    assert valid.tolist() == [True]
+
+
+def test_zero_step_applies_only_limits():
+    # exchangeInfo sends '0.00000000' for a disabled filter
+    quantizer = BinanceQuantizer('0.00000000', '0.001', '10')
+    assert quantizer.format(1.23456789) == '1.23456789'
+    assert quantizer.format(100) == '100'
+    snapped, valid = quantizer.quantize([1.23456789, 0.0001, 11.0])
+    np.testing.assert_allclose(snapped, [1.23456789, 0.0001, 11.0])
+    assert valid.tolist() == [True, False, False]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from backtrader_binance.binance_queue import BinanceQueue
+
+
+def items(queue):
+    taken = []
+    while (item := queue.get()) is not None:
+        taken.append(item)
+    return taken
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BinanceQueue(1, 'newest')
+
+
+def test_drop_oldest():
+    queue = BinanceQueue(2, BinanceQueue.DROP_OLDEST)
+    for i in range(4):
+        queue.put(i)
+    assert items(queue) == [2, 3]
+    assert queue.stats()['dropped'] == 2
+    assert queue.stats()['max_depth'] == 2
+
+
+def test_coalesce_replaces_the_newest():
+    queue = BinanceQueue(2, BinanceQueue.COALESCE)
+    for i in range(4):
+        queue.put(i)
+    assert items(queue) == [0, 3]
+    assert queue.coalesced == 2
+
+
+def test_same_key_replaces_the_newest():
+    queue = BinanceQueue()
+    queue.put('a1', key='a')
+    queue.put('a2', key='a')
+    queue.put('b1', key='b')
+    assert items(queue) == ['a2', 'b1']
+    assert queue.coalesced == 1
+
+
+def test_block_waits_for_room():
+    queue = BinanceQueue(1, BinanceQueue.BLOCK)
+    queue.put(0)
+    put = threading.Thread(target=queue.put, args=(1,))
+    put.start()
+    time.sleep(0.05)
+    assert put.is_alive()  # Waiting for room
+    assert queue.get() == 0
+    put.join(1)
+    assert items(queue) == [1]
+    assert queue.blocked == 1 and queue.dropped == 0
+
+
+def test_block_drops_the_oldest_after_timeout():
+    queue = BinanceQueue(1, BinanceQueue.BLOCK, timeout=0.01)
+    queue.put(0)
+    threading.Thread(target=queue.put, args=(1,)).run()  # Not the consumer, it would not wait
+    assert items(queue) == [1]
+    assert queue.dropped == 1
+
+
+def test_consumer_never_blocks_on_its_own_put():
+    queue = BinanceQueue(1, BinanceQueue.BLOCK)
+    queue.get()  # Registers the consumer thread
+    queue.put(0)
+    queue.put(1)  # Over maxsize instead of waiting for itself
+    assert items(queue) == [0, 1]
+
+
+def test_lag():
+    queue = BinanceQueue()
+    queue.put(0)
+    time.sleep(0.02)
+    queue.get()
+    assert queue.lag >= 0.02 and queue.max_lag == queue.lag
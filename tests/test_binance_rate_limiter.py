@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+import pytest
+from binance.exceptions import BinanceAPIException
+from requests.exceptions import ConnectionError
+
+from backtrader_binance import BinanceAsyncStore, BinanceStore
+from backtrader_binance.binance_rate_limiter import BinanceRateLimiter
+
+
+def test_acquire_takes_weight_and_refills():
+    limiter = BinanceRateLimiter(weight_limit=600, interval=60)  # 10 weight per second
+    limiter.acquire(600)
+    assert limiter.available < 1
+    start = time.monotonic()
+    limiter.acquire(2)  # Waits for the bucket to refill
+    assert time.monotonic() - start >= 0.15
+
+
+def test_update_syncs_with_used_weight():
+    limiter = BinanceRateLimiter(weight_limit=6000)
+    limiter.update(5000)
+    assert limiter.available == pytest.approx(1000, abs=1)
+
+
+def test_backoff_holds_requests():
+    limiter = BinanceRateLimiter()
+    limiter.backoff(0.2)
+    start = time.monotonic()
+    asyncio.run(limiter.acquire_async())
+    assert time.monotonic() - start >= 0.2
+
+
+def test_connection_errors_are_retried_with_backoff(monkeypatch):
+    store = BinanceStore('key', 'secret', 'USDT', retries=4, base_url='http://127.0.0.1:1')  # Nothing listens there
+    delays = []
+    monkeypatch.setattr(time, 'sleep', delays.append)
+    with pytest.raises(ConnectionError):
+        store.get_account()
+    assert delays == [0.5, 1.0, 2.0]
+
+
+
+def test_client_errors_are_not_replaced(monkeypatch):
+    offline = BinanceStore('key', 'secret', 'USDT', offline=True)
+    with pytest.raises(RuntimeError) as raised:
+        offline.get_account()
+    assert raised.value.__context__ is None  # Not raised again while handling the first one
+
+    store = BinanceStore('key', 'secret', 'USDT', retries=4, base_url='http://127.0.0.1:1')
+    monkeypatch.setattr(time, 'sleep', lambda delay: None)
+    redirect = store._redirect
+    failures = [ConnectionError("Name resolution failed")] * 2
+
+    def redirect_failing(client):  # The client can't be built twice
+        if failures:
+            raise failures.pop()
+        redirect(client)
+    store._redirect = redirect_failing
+    with pytest.raises(ConnectionError) as raised:
+        store.get_account()
+    assert "Name resolution" not in str(raised.value)  # Retried up to the request, nothing listens there
+    assert store._rest_requests.samples()[('get_account',)] == 4
+
+class FailingClient(object):
+    response = None
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get_account(self):
+        self.calls += 1
+        raise aiohttp.ClientConnectionError("Connection refused")
+
+    async def close_connection(self):
+        pass
+
+
+def test_async_connection_errors_are_retried_with_backoff(monkeypatch):
+    store = BinanceAsyncStore('key', 'secret', 'USDT', retries=3)
+    store._aclient = client = FailingClient()
+    monkeypatch.setattr(BinanceAsyncStore, '_CONNECT_RETRY_DELAY', 0.05)
+    start = time.monotonic()
+    try:
+        with pytest.raises(aiohttp.ClientConnectionError):
+            store.run(store.request('get_account'))
+    finally:
+        store.stop_socket()
+    assert client.calls == 3
+    assert time.monotonic() - start >= 0.15  # 0.05 + 0.1
+
+
+class Response(object):
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+def api_error(status_code, code, headers=None):
+    return BinanceAPIException(Response(headers), status_code, json.dumps({'code': code, 'msg': 'error'}))
+
+
+def test_request_errors_are_classified():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    assert store._request_failed('get_account', ConnectionError(), 3) == 2.0
+    assert store._request_failed('get_account', api_error(400, -1021), 1) is None  # Resync first
+    assert store._request_failed('get_account', api_error(400, -2010), 1) == 0
+    assert store._request_failed('get_account', api_error(429, -1003, {'Retry-After': '7'}), 1) == 0
+    assert store._limiter._blocked_until - time.monotonic() > 6  # Every request waits
+    errors = {labels: value for metric, samples in store.metrics.collect() if metric.name == 'binance_rest_errors_total'
+              for labels, value in samples.items()}
+    assert errors == {('get_account', 'ConnectionError'): 1, ('get_account', -1021): 1,
+                      ('get_account', -2010): 1, ('get_account', -1003): 1}
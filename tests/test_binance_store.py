@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import backtrader as bt
+
+from backtrader_binance import BinanceStore
+from backtrader_binance.binance_orderbook import BinanceOrderBook
+
+
+def depth_update(first, last):
+    return {'e': 'depthUpdate', 's': 'BTCUSDT', 'U': first, 'u': last, 'b': [['100.0', '1.0']], 'a': [['101.0', '1.0']]}
+
+
+def test_replayed_depth_requests_no_snapshot(tmp_path):
+    store = BinanceStore('key', 'secret', 'USDT', replay=str(tmp_path / 'session.journal'))
+    requested = []
+    store._load_order_book_snapshot = requested.append
+    book = BinanceOrderBook('BTCUSDT')
+    store._handle_depth_socket_message(depth_update(1, 2), book)
+    time.sleep(0.1)
+    assert requested == []
+    assert not book.synced
+
+
+def test_balance_snapshot_keeps_newer_stream_updates():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    store.update_balances({'e': 'outboundAccountPosition', 'u': 2000, 'B': [{'a': 'USDT', 'f': '90.0', 'l': '10.0'}]})
+    store.update_balances({'e': 'outboundAccountPosition', 'u': 500, 'B': [{'a': 'BTC', 'f': '1.0', 'l': '0.0'},
+                                                                          {'a': 'ETH', 'f': '2.0', 'l': '0.0'}]})
+    store.get_account = lambda: {'updateTime': 1000, 'balances': [  # Requested before the USDT update
+        {'asset': 'USDT', 'free': '100.0', 'locked': '0.0'},
+        {'asset': 'BTC', 'free': '0.5', 'locked': '0.0'}]}
+    store.load_balances()
+    assert store._balances == {'USDT': (90.0, 10.0, 2000), 'BTC': (0.5, 0.0, 1000), 'ETH': (0.0, 0.0, 1000)}
+
+
+def test_two_stores_stream_side_by_side(exchange):
+    exchange.stream_rate = 20
+    received = {0: threading.Event(), 1: threading.Event()}
+    stores = []
+    try:
+        for i in received:
+            store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+            store.subscribe('btcusdt@kline_1m', lambda msg, i=i: received[i].set())
+            store.start_streams()
+            stores.append(store)
+        assert all(event.wait(5) for event in received.values())
+    finally:
+        for store in stores:
+            store.stop_socket()
+    assert not any(store.binance_socket.is_alive() for store in stores)
+
+
+
+def test_thread_clients_leave_no_event_loop(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    loops = []
+
+    def request():
+        store.get_asset_balance('USDT')
+        try:
+            loops.append(asyncio.get_event_loop_policy().get_event_loop())
+        except RuntimeError:
+            loops.append(None)
+    thread = threading.Thread(target=request)
+    thread.start()
+    thread.join()
+    assert loops == [None]
+
+def test_getdata_returns_the_feed_of_symbol_and_timeframe():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    one = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1)
+    five = store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=5)
+    assert store.getdata(dataname='BTCUSDT', timeframe=bt.TimeFrame.Minutes, compression=1) is one
+    feeds = {sample[0] for metric, samples in store.metrics.collect() if metric.name == 'binance_feed_queue_depth'
+             for sample in samples}
+    assert five is not one and feeds == {'BTCUSDT1m', 'BTCUSDT5m'}
+
+
+def test_order_book_resyncs_after_a_gap():
+    store = BinanceStore('key', 'secret', 'USDT')
+    snapshots = [{'lastUpdateId': 1, 'bids': [], 'asks': []},  # Older than the buffered events, requested again
+                 {'lastUpdateId': 5, 'bids': [['99.0', '1.0']], 'asks': [['102.0', '1.0']]}]
+    store.get_order_book = lambda symbol: snapshots.pop(0)
+    book = BinanceOrderBook('BTCUSDT')
+    store._handle_depth_socket_message(depth_update(3, 6), book)
+    deadline = time.monotonic() + 5
+    while not book.synced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert book.last_update_id == 6 and snapshots == []
+    assert book.best_bid() == (100.0, 1.0)
+
+    snapshots.append({'lastUpdateId': 8, 'bids': [], 'asks': []})
+    store._handle_depth_socket_message(depth_update(8, 9), book)  # 7 was missed
+    deadline = time.monotonic() + 5
+    while book.last_update_id != 9 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert book.last_update_id == 9 and snapshots == []
+    store.stop_socket()
+
+
+def write_exchange_info(cache_dir, tick_size):
+    with open(os.path.join(cache_dir, 'exchangeInfo.json'), 'w') as f:
+        json.dump({'symbols': [{'symbol': 'BTCUSDT', 'filters': [
+            {'filterType': 'PRICE_FILTER', 'minPrice': '0.01', 'maxPrice': '0', 'tickSize': tick_size},
+            {'filterType': 'LOT_SIZE', 'minQty': '0.0001', 'maxQty': '0', 'stepSize': '0.0001'}]}]}, f)
+
+
+def test_filters_are_reloaded_on_the_order_path(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    write_exchange_info(str(tmp_path), '0.01')
+    store = BinanceStore('key', 'secret', 'USDT', offline=True, cache_dir=str(tmp_path), symbols_info_ttl=3600)
+    assert store.format_price('BTCUSDT', 101.234) == '101.23'
+
+    write_exchange_info(str(tmp_path), '0.10')  # The tick size changed on Binance
+    clock[0] += 3000
+    assert store.format_price('BTCUSDT', 101.234) == '101.23'  # Still within the TTL
+    clock[0] += 601
+    assert store.format_price('BTCUSDT', 101.234) == '101.2'
+
+
+def minute(t):
+    return t - t % 60000
+
+
+def test_historical_klines_span_parallel_windows(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    end = minute(int(time.time() * 1000)) - 1
+    start = end - 3500 * 60000 + 12345  # Not on a kline open
+    requests = exchange.requests
+    klines = store.get_historical_klines('BTCUSDT', '1m', start, end)
+    times = [kline[0] for kline in klines]
+    assert times[0] == minute(start) + 60000 and times[-1] == minute(end)
+    assert all(b - a == 60000 for a, b in zip(times, times[1:]))
+    assert exchange.requests - requests == 1 + 4  # First kline probe and 4 windows of 1000
+
+
+def test_historical_klines_skip_the_windows_before_listing(exchange):
+    now = minute(int(time.time() * 1000))
+    exchange.listed['BTCUSDT'] = now - 500 * 60000
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    requests = exchange.requests
+    klines = store.get_historical_klines('BTCUSDT', '1m', now - 10000 * 60000, now - 1)
+    assert klines[0][0] == now - 500 * 60000 and len(klines) == 500
+    assert exchange.requests - requests == 2
+
+
+def test_overlapping_windows_are_deduplicated(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    get_klines = store.get_klines
+    store.get_klines = lambda symbol, interval, start_time, end_time=None, limit=1000: get_klines(
+        symbol, interval, max(start_time - 5 * 60000, 0), end_time, limit)  # Each window starts 5 klines early
+    end = minute(int(time.time() * 1000)) - 1
+    klines = store.get_historical_klines('BTCUSDT', '1m', end + 1 - 2500 * 60000, end)
+    times = [kline[0] for kline in klines]
+    assert times[-1] == minute(end) and len(times) == 2505  # Early klines of the first window, none twice
+    assert all(b - a == 60000 for a, b in zip(times, times[1:]))
+
+
+def test_monthly_klines_are_paged_through_the_limiter(exchange):
+    store = BinanceStore('key', 'secret', 'USDT', base_url=exchange.url)
+    requested = []
+
+    def get_klines(symbol, interval, startTime, endTime=None, limit=1000):
+        requested.append(startTime)
+        count = limit if len(requested) == 1 else 3
+        return [[startTime + i * 1000] + [0] * 11 for i in range(count)]
+
+    store.binance.get_klines = get_klines
+    weights = []
+    acquire = store._limiter.acquire
+    store._limiter.acquire = lambda weight=1: weights.append(weight) or acquire(weight)
+    klines = store.get_historical_klines('BTCUSDT', '1M', 0)
+    assert len(klines) == 1003
+    assert requested == [0, 999001] and weights == [2, 2]
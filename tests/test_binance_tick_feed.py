@@ -0,0 +1,70 @@
+from backtrader_binance import BinanceStore
+
+
+def trade(t, price, quantity=1.0):
+    return {'e': 'aggTrade', 's': 'BTCUSDT', 'T': t, 'p': str(price), 'q': str(quantity)}
+
+
+def book_ticker(t, bid, ask):
+    return {'u': 1, 's': 'BTCUSDT', 'E': t, 'b': str(bid), 'B': '1.0', 'a': str(ask), 'A': '2.0'}
+
+
+def queued(data):
+    bars = []
+    while (bar := data._data.get()) is not None:
+        bars.append(bar)
+    return bars
+
+
+def test_trades_form_bars():
+    data = BinanceStore('key', 'secret', 'USDT', offline=True).gettrades(dataname='BTCUSDT', bar_seconds=1)
+    for t, price in ((1000, 10.0), (1200, 12.0), (1500, 9.0), (1999, 11.0)):
+        data._handle_tick_socket_message(trade(t, price))
+    assert queued(data) == []  # The bar is still forming
+    data._handle_tick_socket_message(trade(2000, 13.0, 2.0))  # Opens the next bar at the boundary
+    assert queued(data) == [[1000, 10.0, 12.0, 9.0, 11.0, 4.0]]
+    data._handle_tick_socket_message(trade(4500, 14.0))  # No trade in the bar between
+    assert queued(data) == [[2000, 13.0, 13.0, 13.0, 13.0, 2.0]]
+    assert data._bar == [4000, 14.0, 14.0, 14.0, 14.0, 1.0]
+
+
+def test_late_ticks_are_dropped():
+    data = BinanceStore('key', 'secret', 'USDT', offline=True).gettrades(dataname='BTCUSDT', bar_seconds=1)
+    data._handle_tick_socket_message(trade(1000, 10.0))
+    data._handle_tick_socket_message(trade(2100, 12.0))
+    data._handle_tick_socket_message(trade(1900, 99.0))  # Of the bar delivered
+    assert data._bar == [2000, 12.0, 12.0, 12.0, 12.0, 1.0]
+    data._handle_tick_socket_message(trade(3000, 13.0))
+    assert queued(data) == [[1000, 10.0, 10.0, 10.0, 10.0, 1.0], [2000, 12.0, 12.0, 12.0, 12.0, 1.0]]
+    data._handle_tick_socket_message(trade(2500, 99.0))  # Of a bar delivered, none being built
+    data._bar = None
+    data._handle_tick_socket_message(trade(2600, 99.0))
+    assert data._bar is None and queued(data) == []
+
+
+def test_bar_is_flushed_once_its_period_is_over():
+    store = BinanceStore('key', 'secret', 'USDT', offline=True)
+    data = store.gettrades(dataname='BTCUSDT', bar_seconds=1)
+    data._handle_tick_socket_message(trade(1000, 10.0))
+    store.replay_time = 1999
+    data._flush_bar()
+    assert queued(data) == []
+    store.replay_time = 2000
+    data._flush_bar()
+    assert queued(data) == [[1000, 10.0, 10.0, 10.0, 10.0, 1.0]]
+
+
+def test_every_tick_is_delivered_without_bar_seconds():
+    data = BinanceStore('key', 'secret', 'USDT', offline=True).gettrades(dataname='BTCUSDT')
+    data._handle_tick_socket_message(trade(1000, 10.0))
+    data._handle_tick_socket_message(trade(1000, 11.0, 0.5))
+    assert queued(data) == [(1000, 10.0, 1.0), (1000, 11.0, 0.5)]
+
+
+def test_book_ticker_bars_keep_the_last_quotes():
+    data = BinanceStore('key', 'secret', 'USDT', offline=True).getbookticker(dataname='BTCUSDT', bar_seconds=1)
+    data._handle_tick_socket_message(book_ticker(1000, 99.0, 101.0))
+    data._handle_tick_socket_message(book_ticker(1500, 103.0, 105.0))
+    data._handle_tick_socket_message(book_ticker(1700, 97.0, 99.0))
+    data._handle_tick_socket_message(book_ticker(2000, 100.0, 102.0))
+    assert queued(data) == [[1000, 100.0, 104.0, 98.0, 98.0, 0.0, 97.0, 1.0, 99.0, 2.0]]